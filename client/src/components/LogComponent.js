@@ -10,10 +10,13 @@ const LogComponent = () => {
   const [logs, setLogs] = useState([]);
   const [isConnected, setIsConnected] = useState(false);
   const eventSourceRef = useRef(null);
+  const lastEventIdRef = useRef(null); // Id of the last stream event, to resume after a reconnect
+  const compactRef = useRef({ keys: [], tickets: {} }); // Key dictionary and last values per ticket of the compact stream
   const frameRef = useRef(null); // This ref should be attached to the element with the scrollbar
   const [showScrollButton, setShowScrollButton] = useState(false);
   const [showMetrics, setShowMetrics] = useState(false); // Initially false to be hidden on mobile
   const [showRight, setShowRight] = useState(false);
+  const [liveMetrics, setLiveMetrics] = useState(null); // Latest "metrics" event pushed by the server
 
 
 
@@ -89,15 +92,34 @@ const LogComponent = () => {
 
       const url = new URL('https://192.168.41.49/stream');
       url.searchParams.append('client_id', clientID);
+      // Field names sent once and only changed values per ticket (decoded by the 'delta' listener)
+      url.searchParams.append('format', 'compact');
+      // Subscription filters in the page URL (e.g. ?equipment_type=Router&rep=jdoe) are applied by the server
+      ['equipment_type', 'rep', 'action', 'escalated', 'columns'].forEach((name) => {
+        new URLSearchParams(window.location.search).getAll(name).forEach((value) => url.searchParams.append(name, value));
+      });
+      // A new EventSource does not send Last-Event-ID itself, so pass it to get exactly the missed events
+      if (lastEventIdRef.current) {
+        url.searchParams.append('last_event_id', lastEventIdRef.current);
+      }
 
       const eventSource = new EventSource(url.toString());
       eventSourceRef.current = eventSource;
 
       eventSource.onopen = () => setIsConnected(true);
 
-      eventSource.onmessage = (event) => {
-        const newLogs = JSON.parse(event.data);
+      // KPI values are pushed whenever they change
+      eventSource.addEventListener('metrics', (event) => {
+        setLiveMetrics(JSON.parse(event.data));
+      });
 
+      // The server dropped this stream for falling behind: resume from the id it suggests
+      eventSource.addEventListener('resync', (event) => {
+        lastEventIdRef.current = JSON.parse(event.data).last_event_id;
+        reconnectEventSource();
+      });
+
+      const appendLogs = (newLogs) => {
         // Update logs
         setLogs((prevLogs) => [...prevLogs, ...newLogs]);
 
@@ -109,6 +131,35 @@ const LogComponent = () => {
         }
       };
 
+      eventSource.onmessage = (event) => {
+        lastEventIdRef.current = event.lastEventId;
+        appendLogs(JSON.parse(event.data));
+      };
+
+      // Compact stream: fields are indexes into the key dictionary, a bare index repeats the ticket's last value
+      eventSource.addEventListener('delta', (event) => {
+        lastEventIdRef.current = event.lastEventId;
+        const message = JSON.parse(event.data);
+        const compact = compactRef.current;
+        if (message.r) {
+          compact.keys = [];
+          compact.tickets = {};
+        }
+        if (message.k) {
+          compact.keys.push(...message.k);
+        }
+        const state = compact.tickets[message.t] || (compact.tickets[message.t] = {});
+        const log = { 'Equipment Ticket': message.t };
+        message.f.forEach((field) => {
+          if (Array.isArray(field)) {
+            state[compact.keys[field[0]]] = field[1];
+          }
+          const name = compact.keys[Array.isArray(field) ? field[0] : field];
+          log[name] = state[name];
+        });
+        appendLogs([log]);
+      });
+
       eventSource.onerror = (error) => {
         console.error('EventSource failed:', error);
         eventSource.close();
@@ -258,7 +309,7 @@ const LogComponent = () => {
         </div>
       </div>
       <div className="app-container">
-        <MetricsDisplay showMetrics={showMetrics} setShowMetrics={toggleShowMetrics} />
+        <MetricsDisplay showMetrics={showMetrics} setShowMetrics={toggleShowMetrics} liveMetrics={liveMetrics} />
         <div className="content-container" ref={frameRef}>
           <div className="frame">
             {!isConnected && <div className="loading-message">Establishing connection...</div>}
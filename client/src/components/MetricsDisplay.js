@@ -1,7 +1,7 @@
 /* MetricsDisplay.js */
 import React, { useEffect, useState } from 'react';
 
-const MetricsDisplay = ({ showMetrics, setShowMetrics }) => {
+const MetricsDisplay = ({ showMetrics, setShowMetrics, liveMetrics }) => {
     const [metrics, setMetrics] = useState(null);
 
     // Fetch the metrics from the backend
@@ -26,13 +26,17 @@ const MetricsDisplay = ({ showMetrics, setShowMetrics }) => {
     };
 
     useEffect(() => {
+        // Initial load, later updates arrive as "metrics" events on the stream
         fetchMetrics();
-        // Set an interval to refresh metrics every 20 minutes
-        const intervalId = setInterval(fetchMetrics, 1200000);
-        // Clear the interval on component unmount
-        return () => clearInterval(intervalId);
     }, []);
 
+    // Apply metrics pushed by the server
+    useEffect(() => {
+        if (liveMetrics) {
+            setMetrics(liveMetrics);
+        }
+    }, [liveMetrics]);
+
     // Toggle the visibility of the metrics
     const toggleMetricsVisibility = () => {
         setShowMetrics(!showMetrics);
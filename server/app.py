@@ -1,6 +1,7 @@
 import time
+import asyncio
 import requests
-from flask import Flask, request, jsonify, Response, stream_with_context, g
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import smartsheet
 from smartsheet.exceptions import ApiError
@@ -9,6 +10,14 @@ import threading
 from threading import Lock
 import textwrap
 from teams_integration import TeamsIntegration
+from sheet_cache import RowSnapshot, SheetReplica, CachedValue
+from rate_limiter import RateLimiter, CallCounter
+from single_flight import SingleFlight, call_key
+from kpi_engine import KpiEngine, KPI_COLUMNS, KPI_CLOSED_STATUSES
+from webhook_pipeline import WebhookWorkerPool, WebhookInbox, DeliveryDeduplicator, group_events
+from event_bus import LocalEventBus, SocketEventBus
+from sse_broadcaster import (SseBroadcaster, StreamFilter, FlushPacer, CompactEncoder, StreamCompressor,
+                             negotiate_encoding, SLOW_CLIENT_POLICIES)
 import sys
 import random
 import datetime
@@ -16,7 +25,7 @@ import pytz
 import json
 import subprocess
 import os
-from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor
 import re
 import dotenv
 import waitress
@@ -32,19 +41,81 @@ SMARTSHEET_ACCESS_TOKEN = os.environ.get('SMARTSHEET_ACCESS_TOKEN')
 SMARTSHEET_SHEET_ID = 8892937224015748
 # SMARTSHEET_SHEET_ID = 7492158143549316
 WEBHOOK_NAME = "smartupdate-webhook"
+METRICS_SHEET_ID = 7492158143549316
+METRICS_WEBHOOK_NAME = "smartupdate-metrics-webhook"
+METRICS_CACHE_TTL_SECONDS = 900  # safety interval only: the metrics sheet webhook expires the cache on every change
+KPI_WINDOW_DAYS = 60
+KPI_SOURCE = os.environ.get('KPI_SOURCE', 'sheet')  # 'local' serves the KPIs computed from the replica once loaded
+METRICS_PUSH_DEBOUNCE_SECONDS = 1  # a burst of row changes is pushed to the dashboards once
+METRICS_PUSH_REFRESH_SECONDS = 900  # safety re-check without a change (day roll of the KPI windows, missed webhook)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'waitress')  # 'aiohttp' serves /stream as asyncio tasks
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 8))  # threads for the Flask routes in aiohttp mode
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 8080))
+# 'local': this process's stream clients only; 'tcp': every worker process on this host, through a broker
+EVENT_BUS = os.environ.get('EVENT_BUS', 'local')
+EVENT_BUS_PORT = int(os.environ.get('EVENT_BUS_PORT', 8765))  # localhost port of the broker shared by the workers
+# 'all': registers the webhooks, ingests them and computes the metrics (one process);
+# 'stream': only serves /stream and the dashboards from what the event bus relays
+WORKER_ROLE = os.environ.get('WORKER_ROLE', 'all')
+SSE_MAX_FLUSHES_PER_SECOND = float(os.environ.get('SSE_MAX_FLUSHES_PER_SECOND', 4))  # faster updates are batched
+SSE_KEEPALIVE_SECONDS = 15  # comment line sent to idle clients so proxies keep the stream open
+SSE_HISTORY_SIZE = int(os.environ.get('SSE_HISTORY_SIZE', 1000))  # frames kept for replay and resume
+SSE_HISTORY_SECONDS = int(os.environ.get('SSE_HISTORY_SECONDS', 3600))  # and for at most this long
+SSE_REPLAY_ON_CONNECT = 50  # recent frames sent to a fresh connection so the log is not empty
+SSE_CLIENT_MAX_LAG_EVENTS = int(os.environ.get('SSE_CLIENT_MAX_LAG_EVENTS', 500))  # unsent frames per client
+SSE_CLIENT_MAX_LAG_BYTES = int(os.environ.get('SSE_CLIENT_MAX_LAG_BYTES', 1 << 20))  # unsent bytes per client
+# What happens past those caps: 'drop_oldest', 'collapse' (one merged frame per ticket) or 'disconnect' (client resyncs)
+SSE_SLOW_CLIENT_POLICY = os.environ.get('SSE_SLOW_CLIENT_POLICY', 'drop_oldest')
+# gzip/deflate /stream responses for clients that accept it ('0' disables)
+SSE_COMPRESSION = os.environ.get('SSE_COMPRESSION', '1') != '0'
+SCHEMA_CACHE_PATH = os.environ.get('SCHEMA_CACHE_PATH', 'sheet_schema.json')  # cached column metadata
+
+# Startup timing breakdown (printed as each phase completes, reported by /api/stats)
+startup_started = time.perf_counter()
+startup_phases = {}
+
+
+def log_startup_phase(name, phase_started):
+    elapsed_ms = round((time.perf_counter() - phase_started) * 1000, 1)
+    startup_phases[name] = elapsed_ms
+    print(f"Startup: {name} took {elapsed_ms} ms")
+
 
 smart = smartsheet.Smartsheet(SMARTSHEET_ACCESS_TOKEN)
 smart.errors_as_exceptions(True)
-sheet = smart.Sheets.get_sheet(SMARTSHEET_SHEET_ID)
-column_map = {column.title: column.id for column in sheet.columns}
 
 MAX_RETRIES = 3
-RETRY_DELAY_SECONDS = 5
+SMARTSHEET_REQUESTS_PER_MINUTE = 300  # Smartsheet's per-token request budget
+SMARTSHEET_BURST = 50  # requests that may be sent back to back before pacing kicks in
+SHEET_SYNC_INTERVAL_SECONDS = 300  # rowsModifiedSince delta sync of the sheet replica
+SHEET_FULL_SYNC_INTERVAL_SECONDS = 3600  # full reload, also drops rows deleted while webhooks were down
+WEBHOOK_MODE = os.environ.get('WEBHOOK_MODE', 'threads')  # 'asyncio' runs webhook processing as coroutines
+WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))  # concurrent process_webhook workers
+WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', 100))  # pending payloads per worker
+WEBHOOK_COALESCE_WINDOW_SECONDS = float(os.environ.get('WEBHOOK_COALESCE_WINDOW_SECONDS', 0.5))  # per row, 0 disables
+WEBHOOK_COALESCE_MAX_SECONDS = 10  # upper bound on how long a burst is held back
+WEBHOOK_RETRY_AFTER_SECONDS = 30  # Retry-After sent to Smartsheet when the queues are full
+WEBHOOK_DEDUP_SIZE = 10000  # event keys remembered to drop redelivered callbacks
+WEBHOOK_DEDUP_TTL_SECONDS = 3600
+WEBHOOK_INBOX_PATH = os.environ.get('WEBHOOK_INBOX_PATH', 'webhook_inbox.db')  # durable log of received payloads
+WEBHOOK_REGISTRATION = os.environ.get('WEBHOOK_REGISTRATION', 'reconcile')  # 'recreate' deletes and recreates on boot
+NGROK_TIMEOUT_SECONDS = 60  # how long to poll for the tunnel URL
+
+TEAMS_TEAM_ID = "364cbee7-956f-4279-938e-51355b788fe2"
+TEAMS_CHANNEL_ID = "19:Z5RKc10ld2RPdIHLaG1N3RFgZYIZLFXw1ZD64rqOOMY1@thread.tacv2"
+
+# Smartsheet API usage by process_webhook (reported by /api/stats)
+webhook_stats = {
+    'webhooks_processed': 0,
+    'api_calls': 0,
+    'last_webhook_api_calls': 0,
+}
+webhook_stats_lock = Lock()
 
 
 # Get column name by id
 def col_name(col_id):
-    return list(column_map.keys())[list(column_map.values()).index(col_id)]
+    return sheet_replica.schema.title(col_id)
 
 
 def escape_values_in_dict(data_dict):
@@ -57,34 +128,32 @@ def escape_values_in_dict(data_dict):
     return {k: escape_value(v) for k, v in data_dict.items()}
 
 
-# Function to delete the existing webhook (if it exists) and create a new one
-def delete_and_create_webhook(name, sheet_id):
-    # Retrieve existing webhooks
-    existing_webhooks = smart.Webhooks.list_webhooks().data
+# Webhooks of this app on the sheet (any callback URL, the tunnel address changes between sessions)
+def is_app_webhook(webhook, sheet_id):
+    return (webhook.scope == 'sheet' and
+            webhook.scope_object_id == sheet_id and
+            webhook.callback_url.endswith('/webhook'))
 
-    # Delete all matching existing webhooks
-    deleted_ids = []
-    for webhook in existing_webhooks:
-        if (webhook.scope == 'sheet' and
-                webhook.scope_object_id == sheet_id and
-                webhook.callback_url.endswith('/webhook')):
 
-            try:
-                smartsheet_api_call_with_retry(smart.Webhooks.delete_webhook, webhook.id)
-                deleted_ids.append(webhook.id)
-                print(f"Deleted existing webhook: {webhook.id}")
-            except Exception as e:
-                print(f"Failed to delete webhook {webhook.id}: {str(e)}")
+# Function to delete webhooks in parallel, returns the ids that were deleted
+def delete_webhooks(webhooks):
+    def delete(webhook):
+        try:
+            smartsheet_api_call_with_retry(smart.Webhooks.delete_webhook, webhook.id)
+            print(f"Deleted existing webhook: {webhook.id}")
+            return webhook.id
+        except Exception as e:
+            print(f"Failed to delete webhook {webhook.id}: {str(e)}")
+            return None
 
-    # Log all deleted webhooks
-    if not deleted_ids:
-        print("No matching webhooks were found to delete.")
-    else:
-        print(f"All matching webhooks deleted: {deleted_ids}")
+    if not webhooks:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(webhooks), 8)) as executor:
+        return [webhook_id for webhook_id in executor.map(delete, webhooks) if webhook_id is not None]
 
-    # Create a new webhook
-    ngrok_process, ngrok_url = run_ngrok()
-    callback_url = f'{ngrok_url}/webhook'
+
+# Function to create and enable the app's webhook for a callback URL
+def create_webhook(name, sheet_id, callback_url, on_enabled=None):
     new_webhook = smartsheet_api_call_with_retry(
         smart.Webhooks.create_webhook,
         smart.models.Webhook({
@@ -99,13 +168,74 @@ def delete_and_create_webhook(name, sheet_id):
 
     # Enable the newly created webhook with retry
     if new_webhook:
-        threading.Thread(target=enable_webhook_with_retry, args=(new_webhook.result.id,)).start()
+        threading.Thread(target=enable_webhook_with_retry, args=(new_webhook.result.id,),
+                         kwargs={'on_enabled': on_enabled}).start()
         return new_webhook.result.id
     else:
         print("Failed to create new webhook.")
         return None
 
 
+# Function to delete the existing webhook (if it exists) and create a new one
+def delete_and_create_webhook(name, sheet_id, on_enabled=None):
+    # Retrieve existing webhooks
+    webhooks_result = smartsheet_api_call_with_retry(smart.Webhooks.list_webhooks)
+    existing_webhooks = webhooks_result.data if webhooks_result else []
+
+    # Delete all matching existing webhooks
+    deleted_ids = delete_webhooks([webhook for webhook in existing_webhooks if is_app_webhook(webhook, sheet_id)])
+
+    # Log all deleted webhooks
+    if not deleted_ids:
+        print("No matching webhooks were found to delete.")
+    else:
+        print(f"All matching webhooks deleted: {deleted_ids}")
+
+    # Create a new webhook
+    ngrok_process, ngrok_url = run_ngrok()
+    return create_webhook(name, sheet_id, f'{ngrok_url}/webhook', on_enabled)
+
+
+# Function to keep an existing enabled webhook when it still points at the tunnel, else replace it.
+# on_enabled() runs once the webhook delivers again (to catch up with what happened meanwhile).
+def reconcile_webhook(name, sheet_id, on_enabled=None):
+    # The webhook list and the tunnel lookup are independent, run them side by side
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        webhooks_future = executor.submit(smartsheet_api_call_with_retry, smart.Webhooks.list_webhooks)
+        ngrok_future = executor.submit(run_ngrok)
+        webhooks_result = webhooks_future.result()
+        ngrok_process, ngrok_url = ngrok_future.result()
+    callback_url = f'{ngrok_url}/webhook'
+    app_webhooks = [webhook for webhook in (webhooks_result.data if webhooks_result else [])
+                    if is_app_webhook(webhook, sheet_id)]
+
+    kept = next((webhook for webhook in app_webhooks
+                 if webhook.callback_url == callback_url and webhook.enabled and
+                 webhook.status == 'ENABLED' and '*.*' in list(webhook.events)), None)
+    deleted_ids = delete_webhooks([webhook for webhook in app_webhooks if webhook is not kept])
+    if deleted_ids:
+        print(f"Stale webhooks deleted: {deleted_ids}")
+
+    if kept is not None:
+        print(f"Reusing enabled webhook {kept.id} for {callback_url}")
+        if on_enabled:
+            on_enabled()
+        return kept.id
+    return create_webhook(name, sheet_id, callback_url, on_enabled)
+
+
+# Function to catch up with edits made while no webhook was delivering (shutdown, startup, re-registration)
+def resync_sheet_replica():
+    def resync():
+        # The full load started at import already covers the downtime, the delta covers the time since it began
+        sheet_replica_loader.join()
+        phase_started = time.perf_counter()
+        if sheet_replica.delta_sync():
+            log_startup_phase('post-registration delta resync', phase_started)
+
+    threading.Thread(target=resync, daemon=True).start()
+
+
 # Define the exponential backoff function
 def exponential_backoff(attempt, max_attempts=5, base_delay=60, max_delay=300):
     if attempt >= max_attempts:
@@ -116,48 +246,116 @@ def exponential_backoff(attempt, max_attempts=5, base_delay=60, max_delay=300):
     return True
 
 
-# Define a threading.Condition object
-thread_condition = threading.Condition()
+# Token bucket shared by every Smartsheet API call in the process
+smartsheet_rate_limiter = RateLimiter(rate=SMARTSHEET_REQUESTS_PER_MINUTE / 60, capacity=SMARTSHEET_BURST)
 
 
-# Function to wrap Smartsheet SDK calls with backoff
+# Seconds requested by the Retry-After header of a failed call (None if absent)
+def retry_after_seconds(api_error):
+    response = getattr(api_error.error, 'request_response', None)
+    try:
+        return float(response.headers['Retry-After'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+# Concurrent identical reads share one in-flight request
+smartsheet_single_flight = SingleFlight()
+
+
+# Function to wrap Smartsheet SDK calls with single-flight reads, rate limiting and backoff
 def smartsheet_api_call_with_retry(call, *args, **kwargs):
+    if getattr(call, '__name__', '').startswith(('get_', 'list_')):
+        return smartsheet_single_flight.do(call_key(call, args, kwargs),
+                                           lambda: smartsheet_api_call_with_backoff(call, *args, **kwargs))
+    return smartsheet_api_call_with_backoff(call, *args, **kwargs)
+
+
+def smartsheet_api_call_with_backoff(call, *args, **kwargs):
     attempt = 0
     max_attempts = 5
     while attempt < max_attempts:
+        smartsheet_rate_limiter.acquire()
         try:
-            return call(*args, **kwargs)
+            result = call(*args, **kwargs)
+            smartsheet_rate_limiter.success()
+            return result
         except smartsheet.exceptions.ApiError as e:
             error_message = f"Error Code: {e.error.result.error_code}, Message: {e.error.result.message}"
             if e.error.result.error_code == 4003:
-                thread_condition.acquire()
-                if not exponential_backoff(attempt, max_attempts):
+                # Slow every caller down and pause the shared bucket, the retry waits in acquire()
+                smartsheet_rate_limiter.throttle(retry_after_seconds(e))
+                if attempt + 1 >= max_attempts:
                     print("Max retry attempts reached for rate limit error. Giving up.")
-                    thread_condition.release()
                     return None
-                thread_condition.release()
             elif e.error.result.error_code == 1006:
                 print(f"Unable to retry, {error_message}")
                 return None
-            else:
-                thread_condition.acquire()
-                if not exponential_backoff(attempt, max_attempts, base_delay=10, max_delay=60):
-                    print(f"Max retry attempts reached. {error_message}")
-                    thread_condition.release()
-                    return None
-                thread_condition.release()
+            # Only this caller sleeps, no lock is held while backing off
+            elif not exponential_backoff(attempt, max_attempts, base_delay=10, max_delay=60):
+                print(f"Max retry attempts reached. {error_message}")
+                return None
         except Exception as e:
             print(f"Unexpected error: {e}")
             return None
         attempt += 1
 
 
-def enable_webhook_with_retry(webhook_id, MAX_RETRIES=5):
+# Live replica of the equipment sheet, row lookups are served from memory
+sheet_replica = SheetReplica(smart, SMARTSHEET_SHEET_ID, smartsheet_api_call_with_retry,
+                             sync_interval=SHEET_SYNC_INTERVAL_SECONDS,
+                             full_sync_interval=SHEET_FULL_SYNC_INTERVAL_SECONDS)
+
+# Only the column schema is needed before serving: from the disk cache, else a columns-only request
+# (stream workers never read the equipment sheet, everything they send comes from the event bus)
+cached_schema_version = None
+if WORKER_ROLE != 'stream':
+    phase_started = time.perf_counter()
+    cached_schema_version = sheet_replica.schema.load_cache(SCHEMA_CACHE_PATH)
+    if cached_schema_version is not None:
+        log_startup_phase('column schema (disk cache)', phase_started)
+    else:
+        sheet_replica.schema.refresh()
+        log_startup_phase('column schema (API)', phase_started)
+
+
+def load_sheet_replica():
+    # Full row load off the startup path, it also validates and refreshes the cached schema
+    phase_started = time.perf_counter()
+    if sheet_replica.load_all():
+        if sheet_replica.version != cached_schema_version:
+            sheet_replica.schema.save_cache(SCHEMA_CACHE_PATH, sheet_replica.version)
+        log_startup_phase('full sheet load (background)', phase_started)
+    else:
+        print("Full sheet load failed, rows will be fetched on demand until the next sync.")
+
+
+# Set when the dashboard metrics may have changed (replica rows, metrics sheet webhook)
+metrics_changed = threading.Event()
+
+# Dashboard KPIs kept up to date from every replica change
+kpi_engine = KpiEngine(sheet_replica.schema, KPI_COLUMNS, KPI_CLOSED_STATUSES, pytz.timezone('US/Eastern'),
+                       window_days=KPI_WINDOW_DAYS, changed=metrics_changed)
+# Local KPIs need every KPI_COLUMNS title (an empty schema means the columns could not be read at all)
+if KPI_SOURCE == 'local' and sheet_replica.columns and kpi_engine.missing_columns():
+    print(f"KPI_COLUMNS titles not found in the equipment sheet ({', '.join(kpi_engine.missing_columns())}), "
+          f"serving the formula sheet metrics instead.")
+    KPI_SOURCE = 'sheet'
+sheet_replica.add_listener(kpi_engine)
+
+sheet_replica_loader = threading.Thread(target=load_sheet_replica, daemon=True)
+if WORKER_ROLE != 'stream':
+    sheet_replica_loader.start()
+
+
+def enable_webhook_with_retry(webhook_id, MAX_RETRIES=8, on_enabled=None):
     for attempt in range(MAX_RETRIES):
         try:
-            time.sleep(5)  # Adjust the sleep duration as needed
+            # Smartsheet verifies the callback while enabling, give the server a moment to start listening
+            time.sleep(min(8, 0.5 * 2 ** attempt))
 
             # Capture the response from the update webhook call
+            smartsheet_rate_limiter.acquire()
             response = smart.Webhooks.update_webhook(
                 webhook_id=webhook_id,
                 webhook_obj=smart.models.Webhook({
@@ -171,6 +369,8 @@ def enable_webhook_with_retry(webhook_id, MAX_RETRIES=5):
             # Check if the webhook was successfully enabled
             if response_dict.get('data', {}).get('enabled', False):
                 print("Webhook enabled successfully.")
+                if on_enabled:
+                    on_enabled()
                 time.sleep(3)
                 os.system('cls')
                 break  # Break out of the loop if successful
@@ -179,44 +379,45 @@ def enable_webhook_with_retry(webhook_id, MAX_RETRIES=5):
                     f"Attempt {attempt + 1} failed to enable webhook. Status: {response_dict.get('data', {}).get('status', 'Unknown')}")
         except Exception as e:
             print(f"Error enabling webhook (attempt {attempt + 1}): {e}")
-
-            # Wait before retrying
-            time.sleep(RETRY_DELAY_SECONDS)
     else:
         print("Max retries reached. Webhook not enabled.")
 
 
+# Public URL of the running ngrok tunnel (None if ngrok is not up yet)
+def get_ngrok_url():
+    try:
+        response = requests.get('http://localhost:4040/api/tunnels', timeout=2)
+        tunnels = response.json().get('tunnels', []) if response.status_code == 200 else []
+        return tunnels[0]['public_url'] if tunnels else None
+    except (ValueError, KeyError, requests.exceptions.RequestException):
+        return None
+
+
 # Function to run ngrok
-def run_ngrok(max_retries=30):
+def run_ngrok(timeout=NGROK_TIMEOUT_SECONDS):
     print("Checking for existing ngrok session...")
 
-    try:
-        response = requests.get('http://localhost:4040/api/tunnels')
-        if response.status_code == 200:
-            tunnels = response.json().get('tunnels', [])
-            if tunnels:
-                ngrok_url = tunnels[0]['public_url']
-                print(f"Existing ngrok session found: {ngrok_url}")
-                return None, ngrok_url
-    except Exception as e:
-        print(f"Error checking for existing ngrok sessions: {e}")
+    ngrok_url = get_ngrok_url()
+    if ngrok_url:
+        print(f"Existing ngrok session found: {ngrok_url}")
+        return None, ngrok_url
 
     print("Starting ngrok session...")
     creation_flags = subprocess.CREATE_NEW_CONSOLE
-    ngrok_process = subprocess.Popen(['C:\\Users\\mmarcotte\\Documents\\Python\\Apps\\ngrok.exe', 'http', '8080'],
+    ngrok_process = subprocess.Popen(['C:\\Users\\mmarcotte\\Documents\\Python\\Apps\\ngrok.exe', 'http', str(SERVER_PORT)],
                                      creationflags=creation_flags)
-    time.sleep(10)
 
+    # Poll with a short, growing delay: the tunnel is usually up within a second or two
+    deadline = time.monotonic() + timeout
+    delay = 0.25
     try:
-        for attempt in range(max_retries):
-            print("Checking for ngrok URL...", end="")
-            try:
-                ngrok_url = requests.get('http://localhost:4040/api/tunnels').json()['tunnels'][0]['public_url']
-                print(f"\nNgrok URL: {ngrok_url}")
+        while time.monotonic() < deadline:
+            ngrok_url = get_ngrok_url()
+            if ngrok_url:
+                print(f"Ngrok URL: {ngrok_url}")
                 return ngrok_process, ngrok_url
-            except (IndexError, KeyError, requests.exceptions.RequestException):
-                print(" failed.")
-                time.sleep(10)  # Adjust based on your needs
+            time.sleep(delay)
+            delay = min(2, delay * 2)
     except KeyboardInterrupt:
         print("Ngrok URL fetch process interrupted.")
 
@@ -224,12 +425,19 @@ def run_ngrok(max_retries=30):
     raise Exception("Failed to obtain ngrok public URL after multiple attempts.")
 
 
+# Snapshots and replicas serve rows from memory (their own fetches are rate limited), SDK sheets hit the API
+def fetch_row(sheet_arg, row_id):
+    if isinstance(sheet_arg, RowSnapshot):
+        return sheet_arg.get_row(row_id)
+    return smartsheet_api_call_with_retry(sheet_arg.get_row, row_id)
+
+
 # Retrieve smartsheet cell value with column id
 def get_value(sheet_arg, row_id, column_id):
     zero_val = False
 
     # Retrieve the row using row ID
-    row = smartsheet_api_call_with_retry(sheet_arg.get_row, row_id)
+    row = fetch_row(sheet_arg, row_id)
 
     # Check if the row is not None
     if row is not None:
@@ -260,16 +468,15 @@ def get_value(sheet_arg, row_id, column_id):
 
 # Retrieve smartsheet cell value with column string
 def get_value_str(sheet_arg, row_id, column_str):
-    column_map = {column.title: column.id for column in sheet_arg.columns}
     zero_val = False
 
     # Retrieve the row using row ID
-    row = smartsheet_api_call_with_retry(sheet_arg.get_row, row_id)
+    row = fetch_row(sheet_arg, row_id)
 
     # Check if the row is not None
     if row is not None:
         # Retrieve the column value using column title
-        value = row.get_column(column_map.get(column_str)).value
+        value = row.get_column(sheet_arg.schema.column_id(column_str)).value
 
         if str(value).startswith("0"):
             zero_val = True
@@ -295,16 +502,25 @@ def get_value_str(sheet_arg, row_id, column_str):
 user_info_cache = {}  # Cache structure: {user_id: user_info, email: user_info}
 users_list_last_fetched = None
 cache_ttl_seconds = 3600  # Cache TTL
+user_cache_lock = threading.Lock()
+
+
+def user_cache_is_stale(current_time):
+    return users_list_last_fetched is None or (current_time - users_list_last_fetched > cache_ttl_seconds)
 
 
 def update_user_cache():
     global users_list_last_fetched, user_info_cache
     current_time = time.time()
+    if not user_cache_is_stale(current_time):
+        return
 
-    # Refresh cache if it's stale
-    if users_list_last_fetched is None or (current_time - users_list_last_fetched > cache_ttl_seconds):
+    # Refresh cache if it's stale (once, even when many threads notice at the same time)
+    with user_cache_lock:
+        if not user_cache_is_stale(current_time):
+            return
         try:
-            users_list = smart.Users.list_users(include_all=True).data
+            users_list = smartsheet_api_call_with_retry(smart.Users.list_users, include_all=True).data
             users_list_last_fetched = current_time
             # Update cache
             user_info_cache = {user.id: user for user in users_list}
@@ -373,7 +589,7 @@ def parse_serial_numbers(serial_text):
         return re.sub(r'\s+', ' ', serial_text)
 
 
-def print_equipment_ticket_info(ticket_num, ticket_info, add_up, timestamp):
+def print_equipment_ticket_info(ticket_num, ticket_info, add_up, timestamp, row_id=None):
     max_column_name_length = ticket_info['_max_column_name_length']
     user_id = ticket_info.get('user_id', '')
     separator = '─' * 100
@@ -470,7 +686,7 @@ def print_equipment_ticket_info(ticket_num, ticket_info, add_up, timestamp):
             for line in lines[1:]:
                 print(f' {sub_indent}{line}')
     # print(json.dumps(ticket_data, indent=2))
-    add_ticket_to_queue(ticket_data)
+    add_ticket_to_queue(ticket_data, row_id)
     return ticket_data
 
 
@@ -487,17 +703,11 @@ def send_adaptive_card_with_retries(teams_integration, adaptive_card_template_pa
     for retry_count in range(max_retries):
         try:
             if retry_count >= 1:
-                # Re-fetch dynamic data
+                # Re-fetch dynamic data (one row fetch when reading from a snapshot)
+                if isinstance(sheet, RowSnapshot):
+                    sheet.refresh(row_id)
                 dynamic_data = {
-                    "prov_rep": escape_value(get_value_str(sheet, row_id, 'Prov Username')),
-                    "eqp_type": escape_value(get_value_str(sheet, row_id, 'Equipment Type')),
-                    "conf_rep": escape_value(get_value_str(sheet, row_id, 'Config Lab Rep')),
-                    "cust_name": escape_value(get_value_str(sheet, row_id, 'Customer Name')),
-                    "ticket_num": escape_value(get_value_str(sheet, row_id, 'Equipment Ticket')),
-                    "requested_arrival": escape_value(get_value_str(sheet, row_id, 'Requested Arrival')),
-                    "acct_num": escape_value(get_value_str(sheet, row_id, 'Child Account')),
-                    "escalated_str": escape_value(
-                        get_value_str(sheet, row_id, 'Escalated Order') == '1' and 'Yes' or 'No')
+                    key: escape_value(value) for key, value in card_dynamic_data(sheet, row_id).items()
                 }
                 print(json.dumps(dynamic_data, indent=4))
             # Send adaptive card
@@ -516,160 +726,413 @@ def send_adaptive_card_with_retries(teams_integration, adaptive_card_template_pa
 app = Flask(__name__)
 CORS(app)
 
-# Global queue for all ticket data
-global_tickets_queue = Queue()
+# Event log of encoded SSE frames, connected clients send the frames they have not seen yet
+def sse_frame(data, event_type=None):
+    # Final bytes of an SSE message, encoded once whatever the number of clients
+    event_line = f"event: {event_type}\n" if event_type else ''
+    return f"{event_line}data: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+def ticket_frame(ticket_data):
+    # A ticket as a batch of one, the format the log view expects
+    return sse_frame([ticket_data])
+
+
+ticket_broadcaster = SseBroadcaster(history=SSE_HISTORY_SIZE, max_age=SSE_HISTORY_SECONDS, encode=ticket_frame)
+
+
+def ticket_tags(ticket_data, row_id):
+    # Routing tags of a ticket event for /stream filters, read from the sheet replica (no API call)
+    row = sheet_replica.rows.get(row_id) if row_id is not None else None
+    if row is None:
+        return {'action': ticket_data.get('Action')}
+
+    def cell(title):
+        column_id = sheet_replica.schema.by_title.get(title)
+        row_cell = row.get_column(column_id) if column_id is not None else None
+        return row_cell.value if row_cell is not None else None
+
+    # Plain values so the event can cross the event bus (StreamFilter.tags() normalizes them on delivery)
+    return {
+        'equipment_type': cell('Equipment Type'),
+        'reps': [cell('Prov Username'), cell('Config Lab Rep')],
+        'action': ticket_data.get('Action'),
+        'escalated': str(cell('Escalated Order')) in ('1', '1.0', 'True'),
+    }
+
 
-# Lock for thread-safe operations on the clients list
-clients_lock = Lock()
+def add_ticket_to_queue(ticket_data, row_id=None):
+    """
+    Publish ticket data to every connected client whose subscription it matches
+    (in every worker process when the event bus is shared).
+    """
+    event_bus.publish({'type': 'ticket', 'data': ticket_data, 'tags': ticket_tags(ticket_data, row_id)})
 
-# List of client queues
-client_queues = []
 
+# Latest metrics event (values and frame), sent first to clients that connect later
+latest_metrics = None
+latest_metrics_frame = None
 
-def add_ticket_to_queue(ticket_data):
+
+def deliver_stream_event(seq, event):
+    """
+    Event bus subscriber: publish an event to this process's stream clients.
+    With a shared bus, seq becomes the event id so ids match in every worker.
+    """
+    global latest_metrics, latest_metrics_frame
+    if event['type'] == 'metrics':
+        latest_metrics = event['data']
+        latest_metrics_frame = sse_frame(event['data'], 'metrics')
+        ticket_broadcaster.publish(latest_metrics_frame, key='metrics', event_id=seq)
+        return
+    ticket_data = event['data']
+    ticket_broadcaster.publish(ticket_frame(ticket_data), key=ticket_data.get('Equipment Ticket'), data=ticket_data,
+                               tags=StreamFilter.tags(**event['tags']), event_id=seq)
+
+
+if EVENT_BUS == 'tcp':
+    event_bus = SocketEventBus(EVENT_BUS_PORT, history=SSE_HISTORY_SIZE)
+else:
+    event_bus = LocalEventBus()
+event_bus.subscribe(deliver_stream_event)
+event_bus.start()
+
+
+def publish_metrics_forever():
     """
-    Add ticket data to the global queue and to each client's queue.
+    Push the KPI values as a "metrics" event whenever they change.
     """
-    global client_queues
-    with clients_lock:
-        for client_queue in client_queues:
-            client_queue.put(ticket_data)
+    last_values = None
+    while True:
+        # Woken by the replica and the metrics sheet webhook; the long timeout only covers the daily roll
+        # of the 60-day windows and a missed webhook, it is not a polling interval
+        if metrics_changed.wait(timeout=METRICS_PUSH_REFRESH_SECONDS):
+            time.sleep(METRICS_PUSH_DEBOUNCE_SECONDS)
+        metrics_changed.clear()
+        try:
+            values = current_metric_values()
+            if values != last_values:
+                last_values = values
+                # Sorted like the GET endpoint's JSON, so the dashboard order does not change
+                event_bus.publish({'type': 'metrics', 'data': dict(sorted(values.items()))})
+        except Exception as e:
+            print(f"Metrics push failed: {e}")
+
+
+# Only the ingesting worker has up to date rows, stream workers relay its metrics events
+if WORKER_ROLE != 'stream':
+    threading.Thread(target=publish_metrics_forever, daemon=True).start()
 
 
-def stream_tickets(client_queue, batch_size=20, batch_timeout=5):
+def with_current_metrics(frames):
+    # First frames of a stream, ending with the current metrics unless they were replayed already
+    current = latest_metrics_frame
+    if frames is not None and current is not None and not any(frame.endswith(current) for frame in frames):
+        frames.append(current)
+    return frames
+
+
+def stream_tickets(**connect_args):
     """
-    Stream tickets to a single client from their queue in batches.
+    Stream tickets to a single client as they are published, after what it
+    missed since its Last-Event-ID (or the most recent tickets for a fresh client).
+    A lone update is sent immediately, faster updates are sent in batches
+    (at most SSE_MAX_FLUSHES_PER_SECOND). Frames are pre-encoded, nothing is
+    serialized per client.
     """
+    pacer = FlushPacer(SSE_MAX_FLUSHES_PER_SECOND)
+    client = ticket_broadcaster.connect(**connect_args)
     try:
+        # Missed (or recent) frames first, then the current metrics so a replayed older value does not win
+        frames = with_current_metrics(ticket_broadcaster.read(client))
         while True:
-            batch = []
-            start_time = time.time()
-
-            while len(batch) < batch_size and (time.time() - start_time) < batch_timeout:
-                try:
-                    ticket = client_queue.get(timeout=0.1)
-                    batch.append(ticket)
-                except Empty:
-                    if (time.time() - start_time) >= batch_timeout:
-                        break
-
-            if batch:
-                yield f"data: {json.dumps(batch)}\n\n"
+            if frames is None:
+                # Too far behind: tell the client where to resume and close, the missed frames are skipped
+                print(f"Disconnecting slow stream client {client.id} ({client.remote_addr}).")
+                yield sse_frame({'last_event_id': ticket_broadcaster.last_event_id()}, 'resync')
+                return
+
+            if not frames:
+                yield b": keep-alive\n\n"
+            elif pacer.hold():
+                # Updates are arriving fast: collect what else comes in before flushing
+                time.sleep(pacer.hold())
+                more = ticket_broadcaster.read(client)
+                frames = None if more is None else frames + more
+                continue
             else:
-                yield ": keep-alive\n\n"
+                pacer.flushed()
+                client.sent(frames)
+                yield b''.join(frames)
+            frames = ticket_broadcaster.wait(client, SSE_KEEPALIVE_SECONDS)
     finally:
-        with clients_lock:
-            client_queues.remove(client_queue)
+        ticket_broadcaster.disconnect(client)
 
 
-@app.route('/stream')
-def stream():
-    client_queue = Queue()
-    with clients_lock:
-        client_queues.append(client_queue)
+# Headers of every /stream response
+SSE_HEADERS = {
+    # Set here rather than by Flask-CORS, which never sees the aiohttp /stream responses
+    'Access-Control-Allow-Origin': '*',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+    'Content-Type': 'text/event-stream'
+}
+
+
+def query_values(args, name):
+    # Repeated and comma separated values of a query parameter (Flask and aiohttp multidicts)
+    values = args.getlist(name) if hasattr(args, 'getlist') else args.getall(name, [])
+    return [value.strip() for item in values for value in item.split(',') if value.strip()]
+
 
-    # Store the client_queue in the application context
-    g.client_queue = client_queue
+def stream_filter(args):
+    """
+    Subscription of a /stream request, e.g. ?equipment_type=Router&rep=jdoe&action=added
+    &escalated=1&columns=Status,Ship Date (empty: every ticket, every column).
+    """
+    return StreamFilter(
+        equipment_types=query_values(args, 'equipment_type'),
+        reps=query_values(args, 'rep'),
+        actions=query_values(args, 'action'),
+        escalated_only=args.get('escalated', '').lower() in ('1', 'true', 'yes'),
+        columns=query_values(args, 'columns'),
+    )
 
-    headers = {
-        'Cache-Control': 'no-cache',
-        'X-Accel-Buffering': 'no',
-        'Content-Type': 'text/event-stream'
+
+def stream_connect_args(headers, args, remote_addr):
+    # Broadcaster connect() arguments of a /stream request (shared by the Flask and asyncio routes)
+    # Browsers send Last-Event-ID when they reconnect by themselves, the log view passes it explicitly
+    last_event_id = headers.get('Last-Event-ID') or args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    policy = args.get('policy', SSE_SLOW_CLIENT_POLICY)
+    if policy not in SLOW_CLIENT_POLICIES:
+        policy = SSE_SLOW_CLIENT_POLICY
+
+    return {
+        'last_event_id': last_event_id,
+        'replay': SSE_REPLAY_ON_CONNECT,
+        'policy': policy,
+        'max_lag_events': SSE_CLIENT_MAX_LAG_EVENTS,
+        'max_lag_bytes': SSE_CLIENT_MAX_LAG_BYTES,
+        'client_id': args.get('client_id'),
+        'remote_addr': remote_addr,
+        'stream_filter': stream_filter(args),
+        # ?format=compact: key dictionary and per-ticket deltas, encoded for this connection only
+        'encoder': CompactEncoder() if args.get('format') == 'compact' else None,
     }
 
-    return Response(stream_with_context(stream_tickets(client_queue)), headers=headers)
+
+def stream_encoding(headers):
+    # Content-Encoding of a /stream response (None: uncompressed)
+    return negotiate_encoding(headers.get('Accept-Encoding')) if SSE_COMPRESSION else None
+
+
+def stream_headers(encoding):
+    if encoding is None:
+        return SSE_HEADERS
+    return dict(SSE_HEADERS, **{'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'})
+
+
+def compress_stream(chunks, encoding):
+    # Compress each flushed batch of a stream, the compressor's window spans the connection
+    compressor = StreamCompressor(encoding)
+    try:
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+    finally:
+        chunks.close()
+
+
+async def compress_stream_async(chunks, encoding):
+    compressor = StreamCompressor(encoding)
+    try:
+        async for chunk in chunks:
+            yield compressor.compress(chunk)
+    finally:
+        await chunks.aclose()
 
 
-@app.teardown_request
-def remove_client_queue(exception=None):
-    client_queue = g.pop('client_queue', None)
-    if client_queue:
-        with clients_lock:
-            if client_queue in client_queues:
-                client_queues.remove(client_queue)
+@app.route('/stream')
+def stream():
+    connect_args = stream_connect_args(request.headers, request.args, request.remote_addr)
+    encoding = stream_encoding(request.headers)
+    chunks = stream_tickets(**connect_args)
+    if encoding is not None:
+        chunks = compress_stream(chunks, encoding)
+    return Response(stream_with_context(chunks), headers=stream_headers(encoding))
+
+
+async def stream_tickets_async(notifier, **connect_args):
+    """
+    Same stream as stream_tickets, as an async generator for SERVER_MODE=aiohttp:
+    waiting for frames costs no thread.
+    """
+    pacer = FlushPacer(SSE_MAX_FLUSHES_PER_SECOND)
+    client = ticket_broadcaster.connect(**connect_args)
+    try:
+        frames = with_current_metrics(ticket_broadcaster.read(client))
+        while True:
+            if frames is None:
+                print(f"Disconnecting slow stream client {client.id} ({client.remote_addr}).")
+                yield sse_frame({'last_event_id': ticket_broadcaster.last_event_id()}, 'resync')
+                return
+
+            if not frames:
+                yield b": keep-alive\n\n"
+            elif pacer.hold():
+                await asyncio.sleep(pacer.hold())
+                more = ticket_broadcaster.read(client)
+                frames = None if more is None else frames + more
+                continue
+            else:
+                pacer.flushed()
+                client.sent(frames)
+                yield b''.join(frames)
+            # Events filtered out for this client wake it without sending anything until the keep-alive is due
+            keep_alive_at = time.monotonic() + SSE_KEEPALIVE_SECONDS
+            frames = []
+            while frames == [] and time.monotonic() < keep_alive_at:
+                # Nothing can be published between this check and the wait: the wakeup is scheduled on this loop
+                if not ticket_broadcaster.pending(client):
+                    await notifier.wait(keep_alive_at - time.monotonic())
+                frames = ticket_broadcaster.read(client)
+    finally:
+        ticket_broadcaster.disconnect(client)
+
+
+@app.route('/api/admin/stream-clients', methods=['GET'])
+def get_stream_clients():
+    # Connected stream clients with their lag (frames and bytes held back for them) and traffic
+    clients = ticket_broadcaster.client_snapshots()
+    return jsonify({
+        'clients': sorted(clients, key=lambda client: client['lag_bytes'], reverse=True),
+        'total_lag_bytes': sum(client['lag_bytes'] for client in clients),
+        'broadcaster': ticket_broadcaster.snapshot(),
+    })
 
 
 initial_line = False
 user_id_lock = threading.Lock()
 
+# Events already handled, redeliveries are skipped before any API call
+webhook_deduplicator = DeliveryDeduplicator(max_size=WEBHOOK_DEDUP_SIZE, ttl=WEBHOOK_DEDUP_TTL_SECONDS)
 
-def process_webhook(data):
-    global initial_line
+
+def build_equipment_tickets(events):
+    # Group the changed cells of a payload per ticket, values are read from the sheet replica
     timestamp = ''
+    equipment_tickets = {}  # Store updates/additions for each ticket
+    row_events, cells_by_row = group_events(events)
+    for event in row_events:
+        # print(event)
+        current_row = event['id']
+        add_up = "updated" if event['eventType'] == 'updated' else "added"
+        user_id = event.get('userId', None)
+
+        for sub_event in cells_by_row.get(current_row, []):
+            row_id = sub_event['rowId']
+            try:
+                ticket_num = get_value_str(sheet_replica, row_id, 'Equipment Ticket')
+                column_id = sub_event['columnId']
+                updated_value = get_value(sheet_replica, row_id, column_id)
+                column_name = col_name(column_id)
+                original_timestamp = event['timestamp']
+                dt = datetime.datetime.fromisoformat(original_timestamp.rstrip('Z'))
+                eastern = pytz.timezone('US/Eastern')
+                dt_eastern = dt.astimezone(eastern)
+                timestamp = dt_eastern.strftime('%I:%M%p - %b %d %Y')
+            except Exception as e:
+                print(f"Error processing event data: {e}")
+
+            if ticket_num not in equipment_tickets:
+                equipment_tickets[ticket_num] = {
+                    'Equipment Ticket': ticket_num,
+                    '_max_column_name_length': 0,
+                    '_row_id': row_id,
+                    '_add_up': add_up,
+                    'ticket_processed': False,
+                    'Timestamp': timestamp
+                }
+
+            # Acquire the lock before accessing and storing user_id
+            with user_id_lock:
+                equipment_tickets[ticket_num]['user_id'] = user_id
+
+            if column_name == 'Escalated Order':
+                updated_value = "Yes" if int(updated_value) == 1 else "No"
+
+            equipment_tickets[ticket_num][column_name] = updated_value
+            equipment_tickets[ticket_num]['_max_column_name_length'] = max(
+                equipment_tickets[ticket_num]['_max_column_name_length'], len(column_name)
+            )
+    return equipment_tickets, timestamp
+
+
+def start_ticket_block(ticket_num, ticket_info, timestamp):
+    # Print (and stream) a ticket, returns its add_up and row_id
+    global initial_line
+    if not initial_line:
+        print('▄' * 100)
+        print('▀' * 100)
+        initial_line = True
+    add_up = ticket_info.pop('_add_up')
+    row_id = ticket_info.pop('_row_id')
+    print_equipment_ticket_info(ticket_num, ticket_info, add_up, timestamp, row_id)
+    ticket_info['ticket_processed'] = True
+    return add_up, row_id
+
+
+def needs_adaptive_card(add_up, row_id):
+    return add_up == "added" and get_value_str(sheet_replica, row_id, 'Equipment Type') != 'Algo/ATA/Phones'
+
+
+def card_dynamic_data(sheet_arg, row_id):
+    # Values shown on the adaptive card of an added ticket
+    return {
+        "prov_rep": get_value_str(sheet_arg, row_id, 'Prov Username'),
+        "eqp_type": get_value_str(sheet_arg, row_id, 'Equipment Type'),
+        "conf_rep": get_value_str(sheet_arg, row_id, 'Config Lab Rep'),
+        "cust_name": get_value_str(sheet_arg, row_id, 'Customer Name'),
+        "ticket_num": get_value_str(sheet_arg, row_id, 'Equipment Ticket'),
+        "requested_arrival": get_value_str(sheet_arg, row_id, 'Requested Arrival'),
+        "acct_num": get_value_str(sheet_arg, row_id, 'Child Account'),
+        "escalated_str": get_value_str(sheet_arg, row_id, 'Escalated Order') == '1' and 'Yes' or 'No'
+    }
+
+
+def record_webhook_stats(api_calls):
+    with webhook_stats_lock:
+        webhook_stats['webhooks_processed'] += 1
+        webhook_stats['api_calls'] += api_calls
+        webhook_stats['last_webhook_api_calls'] = api_calls
+
+
+def process_webhook(data):
+    # Every Smartsheet call made for this payload takes a limiter token (row fallbacks and retries included)
+    api_calls = CallCounter()
     try:
         # print(data)
-        equipment_tickets = {}  # Store updates/additions for each ticket
-        for event in data['events']:
-            # print(event)
-            if event['objectType'] == 'row':
-                current_row = event['id']
-                add_up = "updated" if event['eventType'] == 'updated' else "added"
-                user_id = event.get('userId', None)
-
-                for sub_event in data['events']:
-                    if sub_event['objectType'] == 'cell' and sub_event['rowId'] == current_row:
-                        row_id = sub_event['rowId']
-                        try:
-                            ticket_num = get_value_str(sheet, row_id, 'Equipment Ticket')
-                            column_id = sub_event['columnId']
-                            updated_value = get_value(sheet, row_id, column_id)
-                            column_name = col_name(column_id)
-                            original_timestamp = event['timestamp']
-                            dt = datetime.datetime.fromisoformat(original_timestamp.rstrip('Z'))
-                            eastern = pytz.timezone('US/Eastern')
-                            dt_eastern = dt.astimezone(eastern)
-                            timestamp = dt_eastern.strftime('%I:%M%p - %b %d %Y')
-                        except Exception as e:
-                            print(f"Error processing event data: {e}")
-
-                        if ticket_num not in equipment_tickets:
-                            equipment_tickets[ticket_num] = {
-                                'Equipment Ticket': ticket_num,
-                                '_max_column_name_length': 0,
-                                '_row_id': row_id,
-                                '_add_up': add_up,
-                                'ticket_processed': False,
-                                'Timestamp': timestamp
-                            }
-
-                        # Acquire the lock before accessing and storing user_id
-                        with user_id_lock:
-                            equipment_tickets[ticket_num]['user_id'] = user_id
-
-                        if column_name == 'Escalated Order':
-                            updated_value = "Yes" if int(updated_value) == 1 else "No"
-
-                        equipment_tickets[ticket_num][column_name] = updated_value
-                        equipment_tickets[ticket_num]['_max_column_name_length'] = max(
-                            equipment_tickets[ticket_num]['_max_column_name_length'], len(column_name)
-                        )
+        if not data['events']:
+            return
+
+        # Patch the replica with the affected rows once; all lookups below are served from memory
+        sheet_replica.apply_events(data['events'])
+        equipment_tickets, timestamp = build_equipment_tickets(data['events'])
 
         for ticket_num, ticket_info in equipment_tickets.items():
             if not ticket_info['ticket_processed']:
-                if not initial_line:
-                    print('▄' * 100)
-                    print('▀' * 100)
-                    initial_line = True
-                add_up = ticket_info.pop('_add_up')
-                row_id = ticket_info.pop('_row_id')
-                print_equipment_ticket_info(ticket_num, ticket_info, add_up, timestamp)
-                ticket_info['ticket_processed'] = True
-
-                if add_up == "added" and get_value_str(sheet, row_id, 'Equipment Type') != 'Algo/ATA/Phones':
+                add_up, row_id = start_ticket_block(ticket_num, ticket_info, timestamp)
+
+                if needs_adaptive_card(add_up, row_id):
                     print("─" * 100)
                     for attempt in range(3):
-                        dynamic_data = {
-                            "prov_rep": get_value_str(sheet, row_id, 'Prov Username'),
-                            "eqp_type": get_value_str(sheet, row_id, 'Equipment Type'),
-                            "conf_rep": get_value_str(sheet, row_id, 'Config Lab Rep'),
-                            "cust_name": get_value_str(sheet, row_id, 'Customer Name'),
-                            "ticket_num": get_value_str(sheet, row_id, 'Equipment Ticket'),
-                            "requested_arrival": get_value_str(sheet, row_id, 'Requested Arrival'),
-                            "acct_num": get_value_str(sheet, row_id, 'Child Account'),
-                            "escalated_str": get_value_str(sheet, row_id,
-                                                           'Escalated Order') == '1' and 'Yes' or 'No'
-                        }
-                        dynamic_data = escape_values_in_dict(dynamic_data)
+                        if attempt >= 1:
+                            # Cells of a new row can be filled in late, so re-fetch it before retrying
+                            sheet_replica.refresh(row_id)
+                        dynamic_data = escape_values_in_dict(card_dynamic_data(sheet_replica, row_id))
                         if all(value for value in dynamic_data.values()):
                             break
                         elif attempt == 3:
@@ -678,72 +1141,292 @@ def process_webhook(data):
                             attempt += 1
                             time.sleep(2)
 
-                    # Teams integration and adaptive card sending
-                    teams_integration = TeamsIntegration(
-                        team_id="364cbee7-956f-4279-938e-51355b788fe2",
-                        channel_id="19:Z5RKc10ld2RPdIHLaG1N3RFgZYIZLFXw1ZD64rqOOMY1@thread.tacv2"
-                    )
+                    # Teams integration (shared by every ticket: one token, one HTTP session) and adaptive card sending
+                    teams_integration = TeamsIntegration.shared(TEAMS_TEAM_ID, TEAMS_CHANNEL_ID)
                     adaptive_card_template_path = "adaptive_card_template.json"
-                    result = send_adaptive_card_with_retries(teams_integration, adaptive_card_template_path, sheet,
-                                                             row_id, dynamic_data)
+                    result = send_adaptive_card_with_retries(teams_integration, adaptive_card_template_path,
+                                                             sheet_replica, row_id, dynamic_data)
+                    if result == "success":
+                        print("Adaptive Card sent successfully.".center(100))
+                print('▄' * 100)
+                print('▀' * 100)
+    except Exception as e:
+        print(f"Error processing webhook data: {e}")
+    finally:
+        record_webhook_stats(api_calls.stop())
+
+
+async def send_adaptive_card_with_retries_async(teams_client, adaptive_card_template_path, row_id, dynamic_data,
+                                                max_retries=3):
+    # Async counterpart of send_adaptive_card_with_retries
+    dynamic_data = {
+        key: escape_value(value) for key, value in dynamic_data.items()
+    }
+    for retry_count in range(max_retries):
+        try:
+            if retry_count >= 1:
+                await async_smartsheet.fetch_rows(sheet_replica, [row_id])
+                dynamic_data = {
+                    key: escape_value(value) for key, value in card_dynamic_data(sheet_replica, row_id).items()
+                }
+                print(json.dumps(dynamic_data, indent=4))
+            await teams_client.send_adaptive_card(adaptive_card_template_path, dynamic_data, retry_count)
+            return "success"
+        except Exception as e:
+            if retry_count < max_retries - 1:
+                await asyncio.sleep(5)
+            else:
+                print(f"Max retries reached. Unable to send adaptive card. Error: {e}")
+    return "error"
+
+
+async def process_webhook_async(data):
+    # Same output as process_webhook, with row fetches, Graph lookups and Teams posts awaited on the event loop
+    api_calls = CallCounter()
+    try:
+        if not data['events']:
+            return
+
+        # The user cache is refreshed at most hourly; keep that SDK call off the event loop
+        await asyncio.to_thread(update_user_cache)
+        await async_smartsheet.apply_events(sheet_replica, data['events'])
+        # The shared helpers read the replica, but a row or column it misses is fetched with the SDK:
+        # they run on a thread so such a fetch never blocks the event loop
+        equipment_tickets, timestamp = await asyncio.to_thread(build_equipment_tickets, data['events'])
+
+        for ticket_num, ticket_info in equipment_tickets.items():
+            if not ticket_info['ticket_processed']:
+                add_up, row_id = await asyncio.to_thread(start_ticket_block, ticket_num, ticket_info, timestamp)
+
+                if await asyncio.to_thread(needs_adaptive_card, add_up, row_id):
+                    print("─" * 100)
+                    for attempt in range(3):
+                        if attempt >= 1:
+                            # Cells of a new row can be filled in late, so re-fetch it before retrying
+                            await async_smartsheet.fetch_rows(sheet_replica, [row_id])
+                        dynamic_data = escape_values_in_dict(
+                            await asyncio.to_thread(card_dynamic_data, sheet_replica, row_id))
+                        if all(value for value in dynamic_data.values()):
+                            break
+                        await asyncio.sleep(2)
+
+                    result = await send_adaptive_card_with_retries_async(async_teams, "adaptive_card_template.json",
+                                                                         row_id, dynamic_data)
                     if result == "success":
                         print("Adaptive Card sent successfully.".center(100))
                 print('▄' * 100)
                 print('▀' * 100)
     except Exception as e:
         print(f"Error processing webhook data: {e}")
+    finally:
+        record_webhook_stats(api_calls.stop())
+
+
+# Stream workers answer /webhook with 503: they run no pipeline threads and leave the inbox to the ingesting worker
+webhook_pool = None
+webhook_inbox = None
+if WORKER_ROLE != 'stream':
+    if WEBHOOK_MODE == 'asyncio':
+        # One event loop processes every payload; rows run concurrently, each row in order
+        from async_pipeline import AsyncWebhookPipeline, AsyncSmartsheetClient, AsyncTeamsClient
+
+        async_smartsheet = AsyncSmartsheetClient(SMARTSHEET_ACCESS_TOKEN, smartsheet_rate_limiter)
+        async_teams = AsyncTeamsClient(TEAMS_TEAM_ID, TEAMS_CHANNEL_ID)
+        webhook_pool = AsyncWebhookPipeline(process_webhook_async, max_pending=WEBHOOK_WORKERS * WEBHOOK_QUEUE_SIZE)
+    else:
+        # Bounded worker pool, events are sharded by row id so each row is processed in order and
+        # rapid-fire updates to the same row are merged into one fetch, console block and SSE message
+        webhook_pool = WebhookWorkerPool(process_webhook, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE,
+                                         coalesce_window=WEBHOOK_COALESCE_WINDOW_SECONDS,
+                                         coalesce_max=WEBHOOK_COALESCE_MAX_SECONDS)
+    webhook_pool.start()
+
+    # Payloads are logged here before the ack and removed once processed
+    webhook_inbox = WebhookInbox(WEBHOOK_INBOX_PATH)
+    webhook_inbox.start()
+
+
+def replay_webhook_inbox():
+    # Process payloads that were acked but not finished when the server last stopped
+    entries = webhook_inbox.pending()
+    if entries:
+        print(f"Replaying {len(entries)} unprocessed webhook payload(s)...")
+    for entry_id, data in entries:
+        # Remembered, so Smartsheet redelivering one of these payloads later is dropped
+        process_webhook(webhook_deduplicator.filter(data))
+        webhook_inbox.mark_done(entry_id)
 
 
 # Endpoint to handle incoming webhooks
 @app.route('/webhook', methods=['POST'])
 def webhook():
+    if WORKER_ROLE == 'stream':
+        # The load balancer should only send /webhook to the ingesting worker, Smartsheet retries later
+        return jsonify({'status': 'This worker only serves streams'}), 503
     data = request.json
     if 'challenge' in data:
         # Respond to verification challenge
         return jsonify({"smartsheetHookResponse": data['challenge']})
-    else:
+    if data.get('scopeObjectId') == METRICS_SHEET_ID:
+        # The metrics sheet changed, the next dashboard request re-reads it
+        metrics_cache.invalidate()
+        metrics_changed.set()
+        return jsonify({'status': 'Metrics cache invalidated'})
+    # Redelivered events are dropped before the pool merges payloads (the keys of merged-away events count too)
+    data = webhook_deduplicator.filter(data)
+    if not data['events']:
+        return jsonify({'status': 'Webhook already processed'})
+    entry_id = webhook_inbox.append(data)
+    if webhook_pool.submit(data, done=lambda: webhook_inbox.mark_done(entry_id)):
         # Handle webhook data
-        thread = threading.Thread(target=process_webhook, args=(data,))
-        thread.start()
         return jsonify({'status': 'Webhook received, processing in background'})
+    else:
+        # Queues are full, let Smartsheet redeliver later
+        webhook_deduplicator.forget(data)
+        webhook_inbox.mark_done(entry_id)
+        response = jsonify({'status': 'Webhook queue full, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(WEBHOOK_RETRY_AFTER_SECONDS)
+        return response
+
+
+# "metric_name": (row_id, column_id) on the metrics sheet
+METRIC_CELLS = {
+    "Average Days to Ship": (6835787952197508, 6859193865686916),  # days from creation to ship
+    "Current Open Tickets": (6835787952197508, 1229694331473796),  # current open tickets
+    "Active Escalations": (7961687859040132, 6859193865686916),  # current open escalations
+    "Tickets Created (Past 60 Days)": (3833559068807044, 92410932580228),  # sum tickets added past 30 days
+    "Tickets Shipped (Past 60 Days)": (3833559068807044, 4596010559950724),  # sum tickets shipped past 30 days
+    "Shipping Variance (Actual Ship vs Requested Ship)": (6835787952197508, 5733293958844292),
+    # +/- requested ship vs actual ship
+    "Shipped On Time %": (6835787952197508, 4905128030064516)
+}
+
+
+def load_metric_values():
+    # One get_sheet call filtered to the metric rows and columns, instead of the whole sheet plus a get_row per metric
+    metric_sheet = RowSnapshot(smart, METRICS_SHEET_ID, [], smartsheet_api_call_with_retry)
+    metric_sheet.fetch_rows([row_id for row_id, _ in METRIC_CELLS.values()],
+                            column_ids=list(dict.fromkeys(column_id for _, column_id in METRIC_CELLS.values())))
+    if not metric_sheet.rows:
+        raise Exception("Metrics sheet could not be read.")
+
+    metric_values = {}
+    for metric_name, (row_id, column_id) in METRIC_CELLS.items():
+        # Use the get_value function to retrieve the value for each metric
+        metric_values[metric_name] = str(get_value(metric_sheet, row_id, column_id))
+    return metric_values
+
+
+# Shared by every dashboard, reloaded after the TTL or when the metrics sheet webhook fires
+metrics_cache = CachedValue(load_metric_values, METRICS_CACHE_TTL_SECONDS)
+
+
+def current_metric_values(source=None):
+    # Formula sheet values unless KPI_SOURCE (or ?source=) is 'local' and the replica is loaded
+    if WORKER_ROLE == 'stream' and latest_metrics is not None:
+        # What the ingesting worker last published (stream workers keep no replica)
+        return latest_metrics
+    if (source or KPI_SOURCE) == 'local' and kpi_engine.ready and not kpi_engine.missing_columns():
+        return kpi_engine.values()
+    return metrics_cache.get()
 
 
 @app.route('/api/smartsheet/metric-value', methods=['GET'])
 def get_metric_value():
-    # "metric_name": (row_id, column_id)
-    metric_dict = {
-        "Average Days to Ship": (6835787952197508, 6859193865686916),  # days from creation to ship
-        "Current Open Tickets": (6835787952197508, 1229694331473796),  # current open tickets
-        "Active Escalations": (7961687859040132, 6859193865686916),  # current open escalations
-        "Tickets Created (Past 60 Days)": (3833559068807044, 92410932580228),  # sum tickets added past 30 days
-        "Tickets Shipped (Past 60 Days)": (3833559068807044, 4596010559950724),  # sum tickets shipped past 30 days
-        "Shipping Variance (Actual Ship vs Requested Ship)": (6835787952197508, 5733293958844292),
-        # +/- requested ship vs actual ship
-        "Shipped On Time %": (6835787952197508, 4905128030064516)
+    return jsonify(current_metric_values(request.args.get('source')))
+
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    with webhook_stats_lock:
+        stats = {'webhooks': dict(webhook_stats)}
+    stats['webhook_pool'] = webhook_pool.snapshot() if webhook_pool is not None else None
+    stats['webhook_inbox'] = webhook_inbox.snapshot() if webhook_inbox is not None else None
+    stats['webhook_dedup'] = webhook_deduplicator.snapshot()
+    stats['rate_limiter'] = smartsheet_rate_limiter.snapshot()
+    stats['single_flight'] = smartsheet_single_flight.snapshot()
+    stats['startup'] = dict(startup_phases)
+    stats['sse'] = ticket_broadcaster.snapshot()
+    stats['event_bus'] = event_bus.snapshot()
+    stats['metrics_cache'] = metrics_cache.snapshot()
+    stats['kpi_engine'] = kpi_engine.snapshot()
+    if request.args.get('check_kpis'):
+        # Local KPIs that disagree with the formula sheet
+        stats['kpi_engine']['differences'] = kpi_engine.differences(metrics_cache.get())
+    stats['sheet_replica'] = {
+        'rows': len(sheet_replica.rows),
+        'version': sheet_replica.version,
+        'last_sync': sheet_replica.last_sync.isoformat() if sheet_replica.last_sync else None,
+        'api_calls': sheet_replica.api_calls,
     }
+    return jsonify(stats)
 
-    metric_values = {}
-    metric_sheet = smart.Sheets.get_sheet(7492158143549316)
-    for metric_name, (row_id, column_id) in metric_dict.items():
-        # Use the get_value function to retrieve the value for each metric
-        metric_value = str(get_value(metric_sheet, row_id, column_id))
-        metric_values[metric_name] = metric_value
 
-    return jsonify(metric_values)
+def run_debug():
+    app.run(host="0.0.0.0", port=SERVER_PORT, debug=True, use_reloader=False)
 
 
-def run_debug():
-    app.run(host="0.0.0.0", port=8080, debug=True, use_reloader=False)
+def aiohttp_app():
+    # /stream as asyncio tasks, the Flask routes on a thread pool of their own
+    from async_server import AsyncServer, AsyncNotifier, write_stream
+
+    notifiers = []
+
+    def on_startup(loop):
+        notifiers.append(AsyncNotifier(loop))
+        ticket_broadcaster.publish_hooks.append(notifiers[0].notify_threadsafe)
+
+    async def stream_async(request):
+        connect_args = stream_connect_args(request.headers, request.query, request.remote)
+        encoding = stream_encoding(request.headers)
+        chunks = stream_tickets_async(notifiers[0], **connect_args)
+        if encoding is not None:
+            chunks = compress_stream_async(chunks, encoding)
+        return await write_stream(request, chunks, stream_headers(encoding))
+
+    server = AsyncServer(app, {'/stream': stream_async}, wsgi_threads=WSGI_THREADS)
+    return server.make_app(on_startup)
+
+
+def run_aiohttp():
+    from aiohttp import web
+
+    web.run_app(aiohttp_app(), host="0.0.0.0", port=SERVER_PORT, print=None)
 
 
 def run_waitress():
-    waitress.serve(app, host="0.0.0.0", port=8080)
+    # Stalled stream clients block at the per-client cap instead of buffering megabytes inside waitress
+    waitress.serve(app, host="0.0.0.0", port=SERVER_PORT, outbuf_high_watermark=SSE_CLIENT_MAX_LAG_BYTES)
+
 
+log_startup_phase('module load', startup_started)
 
 if __name__ == '__main__':
-    # Delete existing webhook (if it exists) and create a new one
-    webhook_id = delete_and_create_webhook(WEBHOOK_NAME, SMARTSHEET_SHEET_ID)
-    print(f"Webhook ID: {webhook_id}")
+    # Keep the existing webhook when it still matches, else delete and create a new one
+    phase_started = time.perf_counter()
+    if WORKER_ROLE == 'stream':
+        print("Stream worker: webhook registration, sheet sync and inbox replay are left to the ingesting worker.")
+    elif WEBHOOK_REGISTRATION == 'recreate':
+        webhook_id = delete_and_create_webhook(WEBHOOK_NAME, SMARTSHEET_SHEET_ID, resync_sheet_replica)
+        metrics_webhook_id = delete_and_create_webhook(METRICS_WEBHOOK_NAME, METRICS_SHEET_ID,
+                                                       metrics_cache.invalidate)
+        print(f"Webhook ID: {webhook_id}, metrics webhook ID: {metrics_webhook_id}")
+    else:
+        webhook_id = reconcile_webhook(WEBHOOK_NAME, SMARTSHEET_SHEET_ID, resync_sheet_replica)
+        metrics_webhook_id = reconcile_webhook(METRICS_WEBHOOK_NAME, METRICS_SHEET_ID, metrics_cache.invalidate)
+        print(f"Webhook ID: {webhook_id}, metrics webhook ID: {metrics_webhook_id}")
+    log_startup_phase('webhook registration', phase_started)
+
+    if WORKER_ROLE != 'stream':
+        # Keep the sheet replica reconciled in the background
+        sheet_replica.start_sync()
+
+        # Finish anything that was in flight when the server last stopped
+        phase_started = time.perf_counter()
+        replay_webhook_inbox()
+        log_startup_phase('webhook inbox replay', phase_started)
+    log_startup_phase('startup total', startup_started)
 
     # Uncomment below to run app in either debug mode or production
 
@@ -751,4 +1434,7 @@ if __name__ == '__main__':
     # run_debug()
 
     # production
-    run_waitress()
+    if SERVER_MODE == 'aiohttp':
+        run_aiohttp()
+    else:
+        run_waitress()
@@ -0,0 +1,273 @@
+import asyncio
+import random
+import threading
+import time
+
+import aiohttp
+import smartsheet
+
+from sheet_cache import ROW_ID_CHUNK_SIZE, row_changes
+from teams_integration import TeamsIntegration, TeamsIntegrationException, escape_values_in_dict
+from webhook_pipeline import PayloadTracker, split_by_row
+
+
+async def acquire_async(rate_limiter):
+    # Take a token from the shared (thread-based) limiter without blocking the event loop
+    started = time.monotonic()
+    while True:
+        wait = rate_limiter.try_acquire()
+        if wait <= 0:
+            break
+        await asyncio.sleep(wait)
+    waited = time.monotonic() - started
+    if waited > 0.001:
+        rate_limiter.record_wait(waited)
+
+
+class AsyncSmartsheetClient:
+    """
+    Smartsheet REST client for the asyncio pipeline (one pooled aiohttp session).
+
+    Shares the process-wide rate limiter with the SDK calls and returns SDK
+    models, so rows can be stored in the same SheetReplica.
+    """
+
+    API_BASE = 'https://api.smartsheet.com/2.0'
+
+    def __init__(self, access_token, rate_limiter, max_connections=8, max_attempts=5):
+        self.access_token = access_token
+        self.rate_limiter = rate_limiter
+        self.max_connections = max_connections
+        self.max_attempts = max_attempts
+        self.session = None
+        self.api_calls = 0
+
+    def get_session(self):
+        # Created lazily so it belongs to the pipeline's event loop
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers={'Authorization': f'Bearer {self.access_token}', 'Accept': 'application/json'},
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+            )
+        return self.session
+
+    async def request(self, method, path, params=None):
+        # Same policy as smartsheet_api_call_with_backoff: None when the call gives up
+        for attempt in range(self.max_attempts):
+            await acquire_async(self.rate_limiter)
+            self.api_calls += 1
+            try:
+                async with self.get_session().request(method, self.API_BASE + path, params=params) as response:
+                    body = await response.json(content_type=None)
+                    if response.status < 400:
+                        self.rate_limiter.success()
+                        return body
+                    if not isinstance(body, dict):
+                        body = {'message': body}
+                    error_code = body.get('errorCode')
+                    error_message = f"Error Code: {error_code}, Message: {body.get('message')}"
+                    if response.status == 429 or error_code == 4003:
+                        retry_after = response.headers.get('Retry-After')
+                        self.rate_limiter.throttle(float(retry_after) if retry_after else None)
+                        continue
+                    if error_code == 1006:
+                        print(f"Unable to retry, {error_message}")
+                        return None
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error_message = f"Unexpected error: {e}"
+            if attempt + 1 >= self.max_attempts:
+                print(f"Max retry attempts reached. {error_message}")
+                return None
+            await asyncio.sleep(min(60, 10 * 2 ** attempt) + random.uniform(0, 10))
+        print("Max retry attempts reached for rate limit error. Giving up.")
+        return None
+
+    async def get_rows(self, sheet_id, row_ids):
+        # Bulk fetch rows by id (get_sheet filtered by rowIds), all chunks concurrently
+        chunks = [row_ids[start:start + ROW_ID_CHUNK_SIZE] for start in range(0, len(row_ids), ROW_ID_CHUNK_SIZE)]
+        results = await asyncio.gather(*[
+            self.request('GET', f'/sheets/{sheet_id}', params={'rowIds': ','.join(str(row_id) for row_id in chunk)})
+            for chunk in chunks
+        ])
+        rows = []
+        for result in results:
+            if result is not None:
+                rows.extend(smartsheet.models.Sheet(result).rows)
+        return rows, len(chunks)
+
+    async def fetch_rows(self, replica, row_ids):
+        rows, calls = await self.get_rows(replica.sheet_id, list(dict.fromkeys(row_ids)))
+        replica.store_rows(rows)
+        return calls
+
+    async def apply_events(self, replica, events):
+        # Async counterpart of SheetReplica.apply_events
+        schema_changed, changed_rows, deleted_rows = row_changes(events)
+        calls = 0
+        if schema_changed:
+            result = await self.request('GET', f'/sheets/{replica.sheet_id}/columns', params={'includeAll': 'true'})
+            calls += 1
+            if result is not None:
+                replica.schema.update([smartsheet.models.Column(column) for column in result.get('data', [])])
+        replica.drop_rows(deleted_rows)
+        calls += await self.fetch_rows(replica, changed_rows)
+        return calls
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class AsyncTeamsClient:
+    """
+    Graph user lookups and Teams posts for the asyncio pipeline.
+
+    Authentication and card building reuse the shared TeamsIntegration; only
+    the HTTP calls run on the event loop.
+    """
+
+    GRAPH_BASE = 'https://graph.microsoft.com/v1.0'
+
+    def __init__(self, team_id, channel_id, max_connections=8):
+        self.team_id = team_id
+        self.channel_id = channel_id
+        self.max_connections = max_connections
+        self.teams_integration = None
+        self.session = None
+
+    async def get_integration(self):
+        # The process-wide client (its MSAL setup can hit the network, so it runs off the event loop, once)
+        if self.teams_integration is None:
+            self.teams_integration = await asyncio.to_thread(TeamsIntegration.shared, self.team_id, self.channel_id)
+        return self.teams_integration
+
+    def get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self.session
+
+    async def access_token(self):
+        teams_integration = await self.get_integration()
+        # The in-memory token needs no thread, only an expired one is acquired off the event loop
+        token_response = teams_integration.cached_token() or await asyncio.to_thread(teams_integration.authenticate)
+        return token_response['access_token']
+
+    async def get_user_info(self, username):
+        headers = {
+            "Authorization": f"Bearer {await self.access_token()}",
+            "Accept": "application/json"
+        }
+        params = TeamsIntegration.user_lookup_params(username)
+        async with self.get_session().get(f"{self.GRAPH_BASE}/users", headers=headers, params=params) as response:
+            if response.status == 200:
+                return TeamsIntegration.parse_user_info(await response.json())
+            return None
+
+    async def send_html_message(self, payload):
+        headers = {
+            "Authorization": f"Bearer {await self.access_token()}",
+            "Content-Type": "application/json",
+        }
+        teams_url = f"{self.GRAPH_BASE}/teams/{self.team_id}/channels/{self.channel_id}/messages"
+        async with self.get_session().post(teams_url, headers=headers, json=payload) as response:
+            if response.status not in [200, 201, 202]:
+                raise TeamsIntegrationException(response.status, await response.text())
+
+    async def send_adaptive_card(self, template_path, dynamic_data, retry_count):
+        # Same card as TeamsIntegration.send_adaptive_card, both user lookups run concurrently
+        dynamic_data = escape_values_in_dict(dynamic_data)
+        prov_rep_info, conf_rep_info = await asyncio.gather(
+            self.get_user_info(dynamic_data.get('prov_rep', '')),
+            self.get_user_info(dynamic_data.get('conf_rep', '')),
+            return_exceptions=True,
+        )
+        if isinstance(prov_rep_info, Exception) or isinstance(conf_rep_info, Exception):
+            if retry_count < 3:
+                raise prov_rep_info if isinstance(prov_rep_info, Exception) else conf_rep_info
+            prov_rep_info = '' if isinstance(prov_rep_info, Exception) else prov_rep_info
+            conf_rep_info = '' if isinstance(conf_rep_info, Exception) else conf_rep_info
+        teams_integration = await self.get_integration()
+        payload = teams_integration.build_adaptive_card_payload(template_path, dynamic_data,
+                                                                prov_rep_info, conf_rep_info)
+        await self.send_html_message(payload)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class AsyncWebhookPipeline:
+    """
+    Processes webhook payloads as coroutines on one event loop (in its own thread).
+
+    Payloads are split per row: parts for the same row run in delivery order,
+    different rows run concurrently. Same submit()/snapshot() interface as
+    WebhookWorkerPool, including rejecting payloads once max_pending is reached.
+    """
+
+    def __init__(self, handler, max_pending=400):
+        self.handler = handler
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.row_tails = {}
+        self.stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'processed': 0,
+            'failed': 0,
+        }
+
+    def start(self):
+        if self.thread is None:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+
+    def submit(self, data, done=None):
+        parts = split_by_row(data)
+        with self.lock:
+            if self.pending + len(parts) > self.max_pending:
+                self.stats['rejected'] += 1
+                return False
+            self.pending += len(parts)
+            self.stats['accepted'] += 1
+        tracker = PayloadTracker(len(parts), done)
+        if not parts and done:
+            done()
+        self.loop.call_soon_threadsafe(self.schedule, parts, tracker)
+        return True
+
+    def schedule(self, parts, tracker):
+        for row_id, payload in parts.items():
+            previous = self.row_tails.get(row_id)
+            self.row_tails[row_id] = self.loop.create_task(self.run(row_id, payload, previous, tracker))
+
+    async def run(self, row_id, payload, previous, tracker):
+        if previous is not None:
+            # Wait for the row's earlier update, whatever its outcome
+            await asyncio.wait([previous])
+        try:
+            await self.handler(payload)
+            with self.lock:
+                self.stats['processed'] += 1
+        except Exception as e:
+            print(f"Webhook coroutine failed: {e}")
+            with self.lock:
+                self.stats['failed'] += 1
+        finally:
+            with self.lock:
+                self.pending -= 1
+            if self.row_tails.get(row_id) is asyncio.current_task():
+                del self.row_tails[row_id]
+            tracker.part_done()
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['pending'] = self.pending
+        stats['mode'] = 'asyncio'
+        stats['rows_in_flight'] = len(self.row_tails)
+        return stats
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+
+class AsyncNotifier:
+    """
+    Wakes every coroutine waiting for a new stream frame with one threadsafe
+    callback per publish, whatever the number of waiting streams.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify_threadsafe(self):
+        # Called from whichever thread published
+        self.loop.call_soon_threadsafe(self.notify)
+
+    def notify(self):
+        self.event.set()
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def wsgi_environ(request, body):
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': request.path,
+        'QUERY_STRING': request.query_string,
+        'SERVER_NAME': request.host.split(':')[0],
+        'SERVER_PORT': str(request.url.port or 80),
+        'SERVER_PROTOCOL': f'HTTP/{request.version.major}.{request.version.minor}',
+        'REMOTE_ADDR': request.remote or '',
+        'CONTENT_TYPE': request.headers.get('Content-Type', ''),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': request.scheme,
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name in request.headers:
+        key = 'HTTP_' + name.upper().replace('-', '_')
+        if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+            environ[key] = ','.join(request.headers.getall(name))
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    # Runs on a worker thread: the whole (non-streaming) response is collected
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+        response['headers'] = headers
+        return lambda data: None
+
+    app_iter = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return response['status'], response['headers'], body
+
+
+class AsyncServer:
+    """
+    aiohttp server: streaming routes are coroutines on the event loop, every
+    other request is handed to the Flask (WSGI) app on a small thread pool.
+
+    Open streams cost a task each, not a thread, so they never take workers
+    away from /webhook and the API routes.
+    """
+
+    def __init__(self, wsgi_app, stream_routes, wsgi_threads=8):
+        self.wsgi_app = wsgi_app
+        self.stream_routes = stream_routes
+        self.executor = ThreadPoolExecutor(max_workers=wsgi_threads)
+
+    async def handle_wsgi(self, request):
+        body = await request.read()
+        environ = wsgi_environ(request, body)
+        status, headers, body = await asyncio.get_running_loop().run_in_executor(
+            self.executor, call_wsgi, self.wsgi_app, environ)
+        response = web.Response(status=int(status.split(' ', 1)[0]), reason=status.split(' ', 1)[1], body=body)
+        for name, value in headers:
+            if name.lower() not in ('content-length', 'transfer-encoding', 'connection'):
+                response.headers.add(name, value)
+        return response
+
+    def make_app(self, on_startup=None):
+        app = web.Application()
+        for path, handler in self.stream_routes.items():
+            app.router.add_get(path, handler)
+        app.router.add_route('*', '/{tail:.*}', self.handle_wsgi)
+        if on_startup:
+            async def startup(_app):
+                on_startup(asyncio.get_running_loop())
+            app.on_startup.append(startup)
+        return app
+
+
+async def write_stream(request, frames, headers):
+    # Send an async iterator of encoded frames as a streaming response
+    response = web.StreamResponse(headers=headers)
+    await response.prepare(request)
+    try:
+        async for chunk in frames:
+            # Waits for the socket to drain, so a stalled client only stalls its own task
+            await response.write(chunk)
+    except ConnectionResetError:
+        pass
+    finally:
+        await frames.aclose()
+    return response
@@ -0,0 +1,58 @@
+"""
+Grouping a webhook payload's cell events by row.
+
+Synthetic payloads of 1 row event + 9 cell events per row, grouping only
+(no API calls): the nested scan process_webhook used to do for every row
+event, against group_events().
+
+    python bench/group_events.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook_pipeline import group_events
+
+
+def payload(event_count):
+    events = []
+    for row_id in range(event_count // 10):
+        events.append({'objectType': 'row', 'eventType': 'updated', 'id': row_id})
+        events.extend({'objectType': 'cell', 'eventType': 'updated', 'rowId': row_id, 'columnId': column_id}
+                      for column_id in range(9))
+    return events
+
+
+def nested_scan(events):
+    # Every row event re-scans the whole payload for its cells
+    grouped = []
+    for event in events:
+        if event['objectType'] == 'row':
+            cells = [sub_event for sub_event in events
+                     if sub_event['objectType'] == 'cell' and sub_event['rowId'] == event['id']]
+            grouped.append((event, cells))
+    return grouped
+
+
+def single_pass(events):
+    row_events, cells_by_row = group_events(events)
+    return [(event, cells_by_row.get(event['id'], [])) for event in row_events]
+
+
+def timed(function, events, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function(events)
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+if __name__ == '__main__':
+    print(f"{'events':>8}  {'nested scan':>12}  {'group_events':>12}")
+    for event_count, repeat in ((10, 1000), (1000, 20), (10000, 1)):
+        events = payload(event_count)
+        nested_ms, nested = timed(nested_scan, events, repeat)
+        single_ms, single = timed(single_pass, events, repeat)
+        assert nested == single
+        print(f"{event_count:>8}  {nested_ms:>9.3f} ms  {single_ms:>9.3f} ms")
@@ -0,0 +1,80 @@
+"""
+CPU time per ticket update: the publish, and the publish plus every client reading it.
+
+'Before' is the per-client queue where each stream serialized its own copy
+of the ticket; 'after' is the SseBroadcaster, which encodes each frame once.
+The publish is flat in the number of clients; each client's read (the lock
+and the join of its frames) is not, and runs on that client's own stream.
+
+    python bench/sse_fanout.py
+"""
+import json
+import os
+import sys
+import time
+from queue import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sse_broadcaster import SseBroadcaster
+
+UPDATES = 2000
+TICKET = {
+    'Equipment Ticket': 'EQ-12345',
+    'Action': 'updated',
+    'Action By': 'Jane Doe',
+    'Timestamp': '10/18/2026 10:00 AM',
+    'Status': 'In Progress',
+    'Customer Name': 'Acme Corp',
+    'Equipment Type': 'Router',
+    'Serial Number(s)': ['A1', 'B2', 'C3'],
+    'Requested Arrival': '2026-10-30',
+    'Config Lab Rep': 'jdoe',
+    'Notes': 'x' * 200,
+}
+
+
+def per_client_queues(client_count):
+    # (publish, publish + reads) in microseconds per update
+    queues = [Queue() for _ in range(client_count)]
+    publish = total = 0
+    for _ in range(UPDATES):
+        started = time.process_time()
+        for queue in queues:
+            queue.put(TICKET)
+        published = time.process_time()
+        for queue in queues:
+            f"data: {json.dumps([queue.get_nowait()])}\n\n".encode('utf-8')
+        publish += published - started
+        total += time.process_time() - started
+    return publish / UPDATES * 1e6, total / UPDATES * 1e6
+
+
+def broadcaster(client_count):
+    # The publish is timed on its own: interleaved with 500 reads it mostly measures their cache misses
+    shared = SseBroadcaster(history=1000)
+    clients = [shared.connect(max_lag_events=UPDATES) for _ in range(client_count)]
+    started = time.process_time()
+    for _ in range(UPDATES):
+        shared.publish(f"data: {json.dumps([TICKET])}\n\n".encode('utf-8'))
+    publish = time.process_time() - started
+
+    shared = SseBroadcaster(history=1000)
+    clients = [shared.connect(max_lag_events=UPDATES) for _ in range(client_count)]
+    started = time.process_time()
+    for _ in range(UPDATES):
+        shared.publish(f"data: {json.dumps([TICKET])}\n\n".encode('utf-8'))
+        for client in clients:
+            b''.join(shared.read(client))
+    total = time.process_time() - started
+    return publish / UPDATES * 1e6, total / UPDATES * 1e6
+
+
+if __name__ == '__main__':
+    print(f"{'clients':>8}  {'before publish':>15}  {'before total':>13}  {'after publish':>14}  {'after total':>12}  "
+          f"{'read/client':>11}")
+    for client_count in (1, 50, 500):
+        before_publish, before_total = per_client_queues(client_count)
+        after_publish, after_total = broadcaster(client_count)
+        print(f"{client_count:>8}  {before_publish:12.1f} us  {before_total:10.1f} us  {after_publish:11.1f} us  "
+              f"{after_total:9.1f} us  {(after_total - after_publish) / client_count:8.2f} us")
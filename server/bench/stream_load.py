@@ -0,0 +1,96 @@
+"""
+Webhook latency while dashboards hold /stream open, per serving mode.
+
+Starts the server (with the in-memory Smartsheet client of the tests) in a
+subprocess, opens N streams, then times 40 sequential POST /webhook calls
+with a 3 s timeout.
+
+    python bench/stream_load.py waitress 0 3 10
+    python bench/stream_load.py aiohttp 0 10 100 1000
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 8089
+URL = f'http://127.0.0.1:{PORT}'
+WEBHOOK_CALLS = 40
+
+SERVER_SCRIPT = """
+import sys
+import smartsheet
+sys.path[:0] = [{server_dir!r}, {tests_dir!r}]
+from fake_smartsheet import FakeSmartsheet
+smartsheet.Smartsheet = FakeSmartsheet
+import app
+app.run_aiohttp() if sys.argv[1] == 'aiohttp' else app.run_waitress()
+"""
+
+
+def start_server(mode, state_dir):
+    env = dict(os.environ, SERVER_PORT=str(PORT), WEBHOOK_INBOX_PATH=os.path.join(state_dir, 'inbox.db'),
+               SCHEMA_CACHE_PATH=os.path.join(state_dir, 'schema.json'))
+    script = SERVER_SCRIPT.format(server_dir=SERVER_DIR, tests_dir=os.path.join(SERVER_DIR, 'tests'))
+    return subprocess.Popen([sys.executable, '-c', script, mode], env=env, cwd=state_dir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def open_stream(session, streams):
+    try:
+        response = await asyncio.wait_for(
+            session.get(URL + '/stream', timeout=aiohttp.ClientTimeout(total=None, sock_read=None)), 5)
+        streams.append(response)
+    except (asyncio.TimeoutError, aiohttp.ClientError):
+        pass
+
+
+async def measure(mode, stream_count):
+    with tempfile.TemporaryDirectory() as state_dir:
+        server = start_server(mode, state_dir)
+        try:
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+                for _ in range(300):
+                    try:
+                        async with session.get(URL + '/api/stats') as response:
+                            await response.read()
+                        break
+                    except aiohttp.ClientError:
+                        await asyncio.sleep(0.1)
+                streams = []
+                await asyncio.gather(*[open_stream(session, streams) for _ in range(stream_count)])
+                await asyncio.sleep(1)
+                latencies = []
+                timeouts = 0
+                for _ in range(WEBHOOK_CALLS):
+                    started = time.perf_counter()
+                    try:
+                        async with session.post(URL + '/webhook', json={'scopeObjectId': 1, 'events': []},
+                                                timeout=aiohttp.ClientTimeout(total=3)) as response:
+                            await response.read()
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    except (asyncio.TimeoutError, aiohttp.ClientError):
+                        timeouts += 1
+                for stream in streams:
+                    stream.close()
+        finally:
+            server.terminate()
+            server.wait()
+    if latencies:
+        latencies.sort()
+        timing = f"p50 {statistics.median(latencies):.1f} / p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms"
+    else:
+        timing = '-'
+    print(f"{mode:8s} streams {stream_count:5d} (open {len(streams):5d})  webhook {timing:24s} "
+          f"timeouts {timeouts}/{WEBHOOK_CALLS}", flush=True)
+
+
+if __name__ == '__main__':
+    for count in map(int, sys.argv[2:]):
+        asyncio.run(measure(sys.argv[1], count))
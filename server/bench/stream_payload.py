@@ -0,0 +1,99 @@
+"""
+Bytes sent per ticket update by /stream encoding.
+
+300 updates across 30 tickets with 1-3 changed columns each, read by a plain
+JSON client and a compact one, each with and without gzip. Every encoding
+is decoded back and checked against the published tickets.
+
+    python bench/stream_payload.py
+"""
+import json
+import os
+import random
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sse_broadcaster import CompactEncoder, SseBroadcaster, StreamCompressor, StreamFilter
+
+UPDATES = 300
+STATUSES = ['Open', 'In Progress', 'Configured', 'Shipped']
+REPS = ['Jane Doe', 'John Roe', 'System/Automation']
+
+
+def ticket_frame(data):
+    return f"data: {json.dumps([data])}\n\n".encode('utf-8')
+
+
+def column_value(column, ticket):
+    return {
+        'Status': random.choice(STATUSES),
+        'Customer Name': f'Customer {ticket}',
+        'Requested Arrival': '2026-11-01',
+        'Child Account': f'ACC-{ticket}',
+        'Serial Number(s)': [f'SN{ticket}-{index}' for index in range(3)],
+        'Escalated Order': random.choice(['Yes', 'No']),
+        'Ship Date': '2026-10-20',
+    }[column]
+
+
+def updates():
+    random.seed(1)
+    for number in range(UPDATES):
+        ticket = f"EQ-{random.randint(1, 30)}"
+        data = {
+            'Equipment Ticket': ticket,
+            'Action': random.choice(['updated'] * 9 + ['added']),
+            'Action By': random.choice(REPS),
+            'Timestamp': f'10:{number % 60:02d}AM - Oct 18 2026',
+        }
+        for column in random.sample(['Status', 'Customer Name', 'Requested Arrival', 'Child Account',
+                                     'Serial Number(s)', 'Escalated Order', 'Ship Date'], random.randint(1, 3)):
+            data[column] = column_value(column, ticket)
+        yield data
+
+
+def decode_compact(frames, state):
+    # What the log view's 'delta' listener rebuilds
+    logs = []
+    for frame in frames:
+        message = json.loads(frame.split(b'data: ', 1)[1])
+        if message.get('r'):
+            state['keys'] = []
+            state['tickets'] = {}
+        state['keys'] += message.get('k', [])
+        values = state['tickets'].setdefault(message['t'], {})
+        log = {'Equipment Ticket': message['t']}
+        for field in message['f']:
+            if isinstance(field, list):
+                values[state['keys'][field[0]]] = field[1]
+            name = state['keys'][field[0] if isinstance(field, list) else field]
+            log[name] = values[name]
+        logs.append(log)
+    return logs
+
+
+if __name__ == '__main__':
+    broadcaster = SseBroadcaster(first_id=1, encode=ticket_frame)
+    plain = broadcaster.connect()
+    compact = broadcaster.connect(encoder=CompactEncoder())
+    plain_gzip = StreamCompressor('gzip')
+    compact_gzip = StreamCompressor('gzip')
+    gunzip = zlib.decompressobj(31)
+    state = {}
+    totals = {'plain JSON': 0, 'compact': 0, 'plain + gzip': 0, 'compact + gzip': 0}
+    for data in updates():
+        broadcaster.publish(ticket_frame(data), key=data['Equipment Ticket'], data=data,
+                            tags=StreamFilter.tags('Router', (), data['Action'], False))
+        plain_bytes = b''.join(broadcaster.read(plain))
+        compact_frames = broadcaster.read(compact)
+        compressed = plain_gzip.compress(plain_bytes)
+        assert gunzip.decompress(compressed) == plain_bytes
+        assert decode_compact(compact_frames, state) == [data]
+        totals['plain JSON'] += len(plain_bytes)
+        totals['compact'] += sum(len(frame) for frame in compact_frames)
+        totals['plain + gzip'] += len(compressed)
+        totals['compact + gzip'] += len(compact_gzip.compress(b''.join(compact_frames)))
+    for name, total in totals.items():
+        print(f"{name:15s} {total / UPDATES:5.0f} bytes/update")
@@ -0,0 +1,321 @@
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+
+class LocalEventBus:
+    """
+    Stream events delivered to the subscribers of this process, in publish
+    order. The default when one process serves both /webhook and /stream.
+    """
+
+    mode = 'local'
+
+    def __init__(self):
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.stats = {
+            'published': 0,
+            'delivered': 0,
+            'subscriber_errors': 0,
+        }
+
+    def subscribe(self, callback):
+        # callback(seq, event): seq is the bus-wide event number, None when the bus does not number events
+        self.subscribers.append(callback)
+
+    def start(self):
+        pass
+
+    def publish(self, event):
+        # One publisher at a time, so every subscriber sees the same order
+        with self.lock:
+            self.stats['published'] += 1
+            self.deliver(None, event)
+
+    def deliver(self, seq, event):
+        for callback in self.subscribers:
+            try:
+                callback(seq, event)
+            except Exception as e:
+                self.stats['subscriber_errors'] += 1
+                print(f"Event bus subscriber failed: {e}")
+        self.stats['delivered'] += 1
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        stats['mode'] = self.mode
+        return stats
+
+
+def send_timeout(seconds):
+    # SO_SNDTIMEO value: milliseconds (DWORD) on Windows, a struct timeval elsewhere
+    if sys.platform == 'win32':
+        return struct.pack('I', int(seconds * 1000))
+    return struct.pack('ll', int(seconds), 0)
+
+
+def send_message(sock, message):
+    sock.sendall(json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n')
+
+
+class SocketBroker:
+    """
+    Orders the events of every worker process: each published event gets the
+    next sequence number and is sent to every connected worker (the publisher
+    included), so all of them deliver the same events in the same order.
+
+    The last `history` events are kept for workers that (re)connect: a worker
+    sends the last sequence number it saw and gets what it missed. The broker
+    listens on a localhost TCP port (Unix sockets and file locks are not
+    available everywhere); only the process that manages to bind the port
+    runs it, and the port is released with its process, so another worker can
+    take over.
+    """
+
+    # A worker that stops reading for this long is disconnected (it reconnects and catches up)
+    SEND_TIMEOUT_SECONDS = 5
+
+    def __init__(self, port, first_seq=None, history=1000, host='127.0.0.1'):
+        self.host = host
+        self.port = port
+        # Numbers start from the clock (like the stream ids): a broker taking over numbers past what the previous
+        # one sent unless it averaged over one event per millisecond, and a worker still ahead moves it on (attach)
+        self.next_seq = max(int(time.time() * 1000), first_seq if first_seq is not None else 0)
+        self.history = deque(maxlen=history)
+        self.connections = set()
+        # Workers being sent their missed events -> events published meanwhile, sent to them next
+        self.attaching = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.stats = {
+            'published': 0,
+            'replayed': 0,
+            'resyncs': 0,
+            'slow_workers': 0,
+        }
+
+    def acquire(self):
+        # Become the broker if no other process is listening on the port, False otherwise
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if sys.platform == 'win32':
+            # On Windows SO_REUSEADDR would let a second process bind the same port
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            # Rebinding right after a broker exited is fine (its old connections linger in TIME_WAIT)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            server.bind((self.host, self.port))
+            server.listen()
+        except OSError:
+            server.close()
+            return False
+        self.server = server
+        return True
+
+    def start(self):
+        threading.Thread(target=self.accept_forever, daemon=True).start()
+
+    def accept_forever(self):
+        while True:
+            connection, _ = self.server.accept()
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, send_timeout(self.SEND_TIMEOUT_SECONDS))
+            # Events are single small lines, send each one at once
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.serve_connection, args=(connection,), daemon=True).start()
+
+    def serve_connection(self, connection):
+        try:
+            for line in connection.makefile('rb'):
+                message = json.loads(line)
+                if 'since' in message:
+                    self.attach(connection, message['since'])
+                else:
+                    self.publish(message['event'])
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.detach(connection)
+
+    def attach(self, connection, since):
+        # Missed events first, sent outside the lock so a slow worker never holds up publish()
+        with self.lock:
+            oldest = self.history[0][0] if self.history else self.next_seq
+            gap = since is not None and not oldest <= since + 1 <= self.next_seq
+            if gap:
+                # Part of what the worker missed is gone (or was numbered by a previous broker)
+                self.stats['resyncs'] += 1
+                # Whatever it saw, the next events are numbered past it
+                self.next_seq = max(self.next_seq, since + 1)
+            backlog = [message for seq, message in self.history if since is None or gap or seq > since]
+            self.stats['replayed'] += len(backlog)
+            self.attaching[connection] = []
+        if gap:
+            send_message(connection, {'resync': since})
+        while True:
+            for message in backlog:
+                connection.sendall(message)
+            with self.lock:
+                backlog = self.attaching[connection]
+                if not backlog:
+                    # Caught up, publish() sends to it directly from now on
+                    del self.attaching[connection]
+                    self.connections.add(connection)
+                    return
+                self.attaching[connection] = []
+
+    def detach(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+            self.attaching.pop(connection, None)
+        connection.close()
+
+    def publish(self, event):
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            message = json.dumps({'seq': seq, 'event': event}, separators=(',', ':')).encode('utf-8') + b'\n'
+            self.history.append((seq, message))
+            self.stats['published'] += 1
+            for backlog in self.attaching.values():
+                backlog.append(message)
+            for connection in list(self.connections):
+                try:
+                    connection.sendall(message)
+                except OSError:
+                    self.stats['slow_workers'] += 1
+                    self.connections.discard(connection)
+                    try:
+                        # Ends its reader thread, which closes it
+                        connection.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['workers'] = len(self.connections) + len(self.attaching)
+            stats['next_seq'] = self.next_seq
+        return stats
+
+
+class SocketEventBus(LocalEventBus):
+    """
+    Cross-process bus through a SocketBroker: events published by any
+    worker process are delivered to the subscribers of every worker, in the
+    broker's order and numbered by it.
+
+    The first worker to start hosts the broker, the others connect to it. If
+    the broker goes away, the workers reconnect (one of them hosting the new
+    broker, which numbers past the old sequence) and catch up from its history;
+    events it no longer has (or never had) are reported with a resync notice.
+    Events published while disconnected are sent after reconnecting.
+    """
+
+    mode = 'tcp'
+    RECONNECT_DELAY_SECONDS = 0.5
+
+    def __init__(self, port, history=1000, host='127.0.0.1'):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.history = history
+        self.broker = None
+        self.sock = None
+        self.send_lock = threading.Lock()
+        self.last_seq = None
+        self.pending = deque(maxlen=history)
+        self.connected = threading.Event()
+        self.thread = None
+        self.stats['reconnects'] = 0
+        self.stats['resyncs'] = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+            self.connected.wait(5)
+
+    def connect(self):
+        if self.broker is None:
+            broker = SocketBroker(self.port, self.last_seq + 1 if self.last_seq is not None else None,
+                                  self.history, self.host)
+            if broker.acquire():
+                print(f"Hosting the event bus broker on {self.host}:{self.port}")
+                broker.start()
+                self.broker = broker
+        sock = socket.create_connection((self.host, self.port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def run(self):
+        while True:
+            try:
+                sock = self.connect()
+            except OSError:
+                time.sleep(self.RECONNECT_DELAY_SECONDS)
+                continue
+            try:
+                with self.send_lock:
+                    send_message(sock, {'since': self.last_seq})
+                    while self.pending:
+                        send_message(sock, {'event': self.pending[0]})
+                        self.pending.popleft()
+                    self.sock = sock
+                self.connected.set()
+                self.receive(sock)
+            except (OSError, ValueError) as e:
+                print(f"Event bus connection lost: {e}")
+            with self.send_lock:
+                self.sock = None
+            self.connected.clear()
+            sock.close()
+            self.stats['reconnects'] += 1
+            time.sleep(self.RECONNECT_DELAY_SECONDS)
+
+    def receive(self, sock):
+        for line in sock.makefile('rb'):
+            # The broker only replays what came after last_seq, nothing is delivered twice
+            message = json.loads(line)
+            if 'resync' in message:
+                # The broker cannot replay everything after last_seq: those events are lost for this worker
+                # (its stream log restarts at the next id, see SseBroadcaster.rebase_locked)
+                self.stats['resyncs'] += 1
+                print(f"Event bus: events after {message['resync']} could not be replayed, continuing without them")
+                continue
+            self.last_seq = message['seq']
+            self.deliver(message['seq'], message['event'])
+
+    def publish(self, event):
+        # Delivered here too once the broker has ordered it
+        with self.send_lock:
+            self.stats['published'] += 1
+            if self.sock is not None:
+                try:
+                    send_message(self.sock, {'event': event})
+                    return
+                except OSError:
+                    pass
+            self.pending.append(event)
+
+    def snapshot(self):
+        stats = super().snapshot()
+        stats['connected'] = self.connected.is_set()
+        stats['last_seq'] = self.last_seq
+        stats['pending'] = len(self.pending)
+        if self.broker is not None:
+            stats['broker'] = self.broker.snapshot()
+        return stats
+
+
+if __name__ == '__main__':
+    # Standalone broker: python event_bus.py [port]
+    broker = SocketBroker(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    if not broker.acquire():
+        sys.exit(f"Another broker is already running on port {broker.port}")
+    print(f"Event bus broker listening on {broker.host}:{broker.port}")
+    broker.accept_forever()
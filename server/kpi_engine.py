@@ -0,0 +1,212 @@
+import datetime
+import threading
+
+
+# Equipment sheet columns the locally computed KPIs are based on (checked against the sheet when KPI_SOURCE
+# is 'local'). The ticket card reads every one of them except the ship date, which nothing else reads yet.
+KPI_COLUMNS = {
+    'created': 'Created',
+    'shipped': 'Ship Date',
+    'requested_ship': 'Requested Arrival',
+    'status': 'Status',
+    'escalated': 'Escalated Order',
+}
+KPI_CLOSED_STATUSES = ('Shipped', 'Delivered', 'Closed', 'Cancelled')  # not counted as open without a ship date
+
+
+def parse_date(value, timezone):
+    # Smartsheet DATE cells are 'YYYY-MM-DD', system CREATED_DATE cells are ISO timestamps in UTC
+    if not value:
+        return None
+    value = str(value)
+    try:
+        if 'T' in value:
+            moment = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=datetime.timezone.utc)
+            return moment.astimezone(timezone).date()
+        return datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+
+def format_number(value, decimals=1, signed=False):
+    # Same shape as get_value(): whole numbers without a decimal part
+    value = round(value, decimals)
+    if float(value).is_integer():
+        value = int(value)
+    if signed and value > 0:
+        return f"+{value}"
+    return str(value)
+
+
+class DayWindow:
+    """
+    Count of dates falling in the last `days` days (today included).
+
+    Dates are bucketed per day; add()/remove() and the daily roll of the window
+    are O(1) (amortized per day), never a rescan of the rows.
+    """
+
+    def __init__(self, days, today):
+        self.days = days
+        self.buckets = {}
+        self.end = today
+        self.total = 0
+
+    @property
+    def start(self):
+        return self.end - datetime.timedelta(days=self.days - 1)
+
+    def add(self, date, count=1):
+        self.buckets[date] = self.buckets.get(date, 0) + count
+        if not self.buckets[date]:
+            del self.buckets[date]
+        if self.start <= date <= self.end:
+            self.total += count
+
+    def roll(self, today):
+        # Days leave at the start and (future dated) days enter at the end
+        if today - self.end > datetime.timedelta(days=self.days):
+            self.end = today
+            self.total = sum(count for date, count in self.buckets.items() if self.start <= date <= today)
+            return
+        while self.end < today:
+            self.total -= self.buckets.get(self.start, 0)
+            self.end += datetime.timedelta(days=1)
+            self.total += self.buckets.get(self.end, 0)
+
+
+class KpiEngine:
+    """
+    Dashboard KPIs computed from the equipment sheet rows with running aggregates.
+
+    Registered as a listener of the SheetReplica: every row change subtracts the
+    row's previous contribution and adds the new one, so a webhook update costs
+    O(1) whatever the sheet size. values() only formats the running totals.
+    """
+
+    def __init__(self, schema, columns, closed_statuses, timezone, window_days=60, changed=None):
+        self.schema = schema
+        self.columns = columns
+        self.closed_statuses = set(closed_statuses)
+        self.timezone = timezone
+        self.window_days = window_days
+        self.lock = threading.Lock()
+        self.ready = False
+        self.updates = 0
+        # Set on every change, for whoever publishes the values
+        self.changed = changed if changed is not None else threading.Event()
+        self.reset()
+
+    def missing_columns(self):
+        # Configured column titles the sheet does not have (their KPIs would silently read as empty)
+        return [title for title in self.columns.values() if title not in self.schema.by_title]
+
+    def today(self):
+        return datetime.datetime.now(self.timezone).date()
+
+    def reset(self):
+        today = self.today()
+        self.contributions = {}
+        self.open_count = 0
+        self.escalated_count = 0
+        self.shipped_count = 0
+        self.ship_days_sum = 0
+        self.variance_count = 0
+        self.variance_sum = 0
+        self.on_time_count = 0
+        self.created_window = DayWindow(self.window_days, today)
+        self.shipped_window = DayWindow(self.window_days, today)
+
+    def cell(self, row, name):
+        # Plain index lookup: an unconfigured title must not trigger schema refreshes on every row
+        column_id = self.schema.by_title.get(self.columns[name])
+        if column_id is None:
+            return None
+        cell = row.get_column(column_id)
+        return cell.value if cell is not None else None
+
+    def facts(self, row):
+        # What a row contributes: (created, shipped, requested ship date, open, escalated)
+        created = parse_date(self.cell(row, 'created'), self.timezone)
+        shipped = parse_date(self.cell(row, 'shipped'), self.timezone)
+        requested = parse_date(self.cell(row, 'requested_ship'), self.timezone)
+        is_open = shipped is None and self.cell(row, 'status') not in self.closed_statuses
+        escalated = str(self.cell(row, 'escalated')) in ('1', '1.0', 'True')
+        return created, shipped, requested, is_open, escalated
+
+    def apply(self, facts, sign):
+        created, shipped, requested, is_open, escalated = facts
+        if is_open:
+            self.open_count += sign
+            if escalated:
+                self.escalated_count += sign
+        if created is not None:
+            self.created_window.add(created, sign)
+        if shipped is not None:
+            self.shipped_window.add(shipped, sign)
+            if created is not None:
+                self.shipped_count += sign
+                self.ship_days_sum += sign * (shipped - created).days
+            if requested is not None:
+                self.variance_count += sign
+                self.variance_sum += sign * (shipped - requested).days
+                if shipped <= requested:
+                    self.on_time_count += sign
+
+    def row_changed(self, row_id, row):
+        # Replica listener: a row was stored (row) or deleted (None)
+        facts = self.facts(row) if row is not None else None
+        with self.lock:
+            previous = self.contributions.pop(row_id, None)
+            if previous is not None:
+                self.apply(previous, -1)
+            if facts is not None:
+                self.contributions[row_id] = facts
+                self.apply(facts, 1)
+            self.updates += 1
+        self.changed.set()
+
+    def rows_replaced(self, rows):
+        # Replica listener: full load, the only time the aggregates are rebuilt from scratch
+        with self.lock:
+            self.reset()
+            for row_id, row in rows.items():
+                facts = self.facts(row)
+                self.contributions[row_id] = facts
+                self.apply(facts, 1)
+            self.ready = True
+        self.changed.set()
+
+    def values(self):
+        # Same metric names as the formula sheet
+        today = self.today()
+        with self.lock:
+            self.created_window.roll(today)
+            self.shipped_window.roll(today)
+            average_days = self.ship_days_sum / self.shipped_count if self.shipped_count else 0
+            variance = self.variance_sum / self.variance_count if self.variance_count else 0
+            on_time = 100 * self.on_time_count / self.variance_count if self.variance_count else 0
+            return {
+                "Average Days to Ship": format_number(average_days),
+                "Current Open Tickets": str(self.open_count),
+                "Active Escalations": str(self.escalated_count),
+                f"Tickets Created (Past {self.window_days} Days)": str(self.created_window.total),
+                f"Tickets Shipped (Past {self.window_days} Days)": str(self.shipped_window.total),
+                "Shipping Variance (Actual Ship vs Requested Ship)": format_number(variance, signed=True),
+                "Shipped On Time %": f"{format_number(on_time, decimals=0)}%",
+            }
+
+    def differences(self, reference):
+        # Metrics that disagree with another source (e.g. the formula sheet): {name: (local, reference)}
+        local = self.values()
+        return {name: (local.get(name), value) for name, value in reference.items() if local.get(name) != value}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'ready': self.ready,
+                'rows': len(self.contributions),
+                'updates': self.updates,
+            }
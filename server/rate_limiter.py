@@ -0,0 +1,134 @@
+import contextvars
+import threading
+import time
+
+# Counter of the current caller (see CallCounter), None when nobody is counting
+current_counter = contextvars.ContextVar('current_counter', default=None)
+
+
+class CallCounter:
+    """
+    Counts the tokens taken from any RateLimiter by one caller (e.g. one webhook
+    payload), i.e. the API calls it made, retries included, until stop().
+
+    The counter is bound to the caller's context: threads started with
+    asyncio.to_thread count towards it, concurrent callers do not.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.token = current_counter.set(self)
+
+    def stop(self):
+        current_counter.reset(self.token)
+        return self.calls
+
+
+def count_call():
+    counter = current_counter.get()
+    if counter is not None:
+        counter.calls += 1
+
+
+class RateLimiter:
+    """
+    Process-wide token bucket shared by every Smartsheet API call.
+
+    Callers only block themselves while waiting for a token. A rate limit error
+    (4003) halves the refill rate and pauses the bucket for Retry-After seconds;
+    successful calls then restore the rate gradually.
+    """
+
+    def __init__(self, rate, capacity, min_rate=0.5, recovery=0.05, default_pause=60):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.default_pause = default_pause
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.waiters = 0
+        self.condition = threading.Condition()
+        self.stats = {
+            'acquired': 0,
+            'waited': 0,
+            'wait_seconds': 0.0,
+            'throttle_events': 0,
+        }
+
+    def refill(self, now):
+        # Tokens accumulate at the current rate, but not while the bucket is paused
+        start = max(self.updated, self.paused_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = max(self.updated, now)
+
+    def acquire(self):
+        with self.condition:
+            started = time.monotonic()
+            self.waiters += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.refill(now)
+                    if now >= self.paused_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    # wait() releases the lock, so other callers are never held up by this one
+                    self.condition.wait(max(self.paused_until - now, (1 - self.tokens) / self.rate))
+            finally:
+                self.waiters -= 1
+            waited = time.monotonic() - started
+            self.stats['acquired'] += 1
+            count_call()
+            if waited > 0.001:
+                self.stats['waited'] += 1
+                self.stats['wait_seconds'] += waited
+
+    def try_acquire(self):
+        # Non-blocking variant for asyncio callers: takes a token and returns 0, or the seconds to wait
+        with self.condition:
+            now = time.monotonic()
+            self.refill(now)
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                self.stats['acquired'] += 1
+                count_call()
+                return 0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def record_wait(self, seconds):
+        with self.condition:
+            self.stats['waited'] += 1
+            self.stats['wait_seconds'] += seconds
+
+    def success(self):
+        # Additive recovery towards the configured rate after a throttle
+        if self.rate < self.base_rate:
+            with self.condition:
+                self.rate = min(self.base_rate, self.rate + self.recovery)
+
+    def throttle(self, retry_after=None):
+        # Multiplicative slowdown and a pause for everyone after a rate limit error
+        with self.condition:
+            now = time.monotonic()
+            self.refill(now)
+            self.stats['throttle_events'] += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0
+            pause = retry_after if retry_after is not None else self.default_pause
+            self.paused_until = max(self.paused_until, now + pause)
+            self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            now = time.monotonic()
+            self.refill(now)
+            stats = dict(self.stats)
+            stats['tokens'] = round(self.tokens, 2)
+            stats['waiters'] = self.waiters
+            stats['rate_per_second'] = round(self.rate, 3)
+            stats['paused_seconds'] = round(max(0, self.paused_until - now), 1)
+        return stats
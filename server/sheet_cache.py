@@ -0,0 +1,395 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import smartsheet
+
+
+# Maximum number of row ids sent in a single rowIds filter (keeps the query string short)
+ROW_ID_CHUNK_SIZE = 100
+
+
+def row_changes(events):
+    # Split webhook events into (schema changed, changed row ids, deleted row ids)
+    schema_changed = False
+    changed_rows = []
+    deleted_rows = set()
+    for event in events:
+        if event['objectType'] == 'column':
+            schema_changed = True
+        elif event['objectType'] == 'row' and event['eventType'] == 'deleted':
+            deleted_rows.add(event['id'])
+        elif event['objectType'] == 'row':
+            changed_rows.append(event['id'])
+        elif event['objectType'] == 'cell':
+            changed_rows.append(event['rowId'])
+    return schema_changed, [row_id for row_id in changed_rows if row_id not in deleted_rows], deleted_rows
+
+
+class ColumnRegistry:
+    """
+    Column schema of a sheet with O(1) id <-> title lookups and column types.
+
+    Rebuilt whenever the sheet's columns are fetched; refresh() re-reads only the
+    column metadata (used for webhook events of objectType 'column').
+    """
+
+    # Minimum delay between refreshes triggered by unknown column ids
+    MISS_REFRESH_INTERVAL_SECONDS = 10
+
+    def __init__(self, columns=None, smart_client=None, sheet_id=None, api_call=None):
+        self.smart = smart_client
+        self.sheet_id = sheet_id
+        self.api_call = api_call
+        self.lock = threading.Lock()
+        self.last_refresh = 0
+        self.update(columns or [])
+
+    def update(self, columns):
+        columns = list(columns)
+        by_id = {column.id: column.title for column in columns}
+        by_title = {column.title: column.id for column in columns}
+        types = {column.id: column.type for column in columns}
+        with self.lock:
+            self.columns = columns
+            self.by_id = by_id
+            self.by_title = by_title
+            self.types = types
+
+    def refresh(self):
+        # Re-read the column metadata only (no rows)
+        if self.smart is None:
+            return False
+        self.last_refresh = time.time()
+        result = self.api_call(self.smart.Sheets.get_columns, self.sheet_id, include_all=True)
+        if result is None:
+            return False
+        self.update(result.data)
+        return True
+
+    def refresh_on_miss(self):
+        if time.time() - self.last_refresh >= self.MISS_REFRESH_INTERVAL_SECONDS:
+            return self.refresh()
+        return False
+
+    def title(self, column_id):
+        # Column title by id, raises KeyError for unknown columns
+        if column_id not in self.by_id:
+            self.refresh_on_miss()
+        return self.by_id[column_id]
+
+    def column_id(self, title):
+        # Column id by title, None for unknown titles
+        if title not in self.by_title:
+            self.refresh_on_miss()
+        return self.by_title.get(title)
+
+    def column_type(self, column_id):
+        return self.types.get(column_id)
+
+    def save_cache(self, path, version):
+        # Column metadata stamped with the sheet version it was read from
+        data = {
+            'sheet_id': self.sheet_id,
+            'version': version,
+            'columns': [column.to_dict() for column in self.columns],
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temp_path, path)
+
+    def load_cache(self, path):
+        # Load a cached schema, returns the sheet version it was saved at (None if unusable)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get('sheet_id') != self.sheet_id or not data.get('columns'):
+            return None
+        self.update([smartsheet.models.Column(column) for column in data['columns']])
+        return data.get('version')
+
+
+class CachedRow:
+    """
+    A stored row with its cells indexed by column id, built once when the row is
+    stored: get_column() is a dict lookup instead of the SDK Row's scan of its
+    cell list, and is called for every cell read.
+    """
+
+    __slots__ = ('id', 'cells')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.cells = {cell.column_id: cell for cell in row.cells}
+
+    def get_column(self, column_id):
+        return self.cells.get(column_id)
+
+
+class RowSnapshot:
+    """
+    Rows of a sheet fetched once per webhook batch and served from memory.
+
+    Exposes get_row() and columns so it can be passed anywhere a Sheet is
+    accepted by get_value() / get_value_str().
+    """
+
+    def __init__(self, smart_client, sheet_id, columns, api_call):
+        self.smart = smart_client
+        self.sheet_id = sheet_id
+        self.api_call = api_call
+        self.schema = ColumnRegistry(columns, smart_client, sheet_id, api_call)
+        self.rows = {}
+        self.api_calls = 0
+        self.lock = threading.Lock()
+        # Row ids stored or dropped while a full load is in flight (None when not loading)
+        self.changed_during_load = None
+        # Notified of every change: row_changed(row_id, row or None) and rows_replaced(rows)
+        self.listeners = []
+
+    @property
+    def columns(self):
+        return self.schema.columns
+
+    @columns.setter
+    def columns(self, columns):
+        self.schema.update(columns)
+
+    def load(self, row_ids, column_ids=None):
+        # Fetch every row not already in the snapshot with as few get_sheet calls as possible
+        missing = [row_id for row_id in dict.fromkeys(row_ids) if row_id not in self.rows]
+        return self.fetch_rows(missing, column_ids)
+
+    def fetch_rows(self, row_ids, column_ids=None):
+        # Bulk fetch rows by id, returns the number of API calls made
+        row_ids = list(dict.fromkeys(row_ids))
+        calls = 0
+        for start in range(0, len(row_ids), ROW_ID_CHUNK_SIZE):
+            chunk = row_ids[start:start + ROW_ID_CHUNK_SIZE]
+            calls += 1
+            result = self.api_call(self.smart.Sheets.get_sheet, self.sheet_id,
+                                   row_ids=chunk, column_ids=column_ids)
+            if result is not None:
+                self.store_rows(result.rows)
+        with self.lock:
+            self.api_calls += calls
+        return calls
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def store_rows(self, rows):
+        with self.lock:
+            for row in rows:
+                row = CachedRow(row)
+                self.rows[row.id] = row
+                if self.changed_during_load is not None:
+                    self.changed_during_load.add(row.id)
+                for listener in self.listeners:
+                    listener.row_changed(row.id, row)
+
+    def drop_rows(self, row_ids):
+        with self.lock:
+            for row_id in row_ids:
+                removed = self.rows.pop(row_id, None)
+                if self.changed_during_load is not None:
+                    self.changed_during_load.add(row_id)
+                if removed is not None:
+                    for listener in self.listeners:
+                        listener.row_changed(row_id, None)
+
+    def refresh(self, row_id):
+        # Fetch a row again (used when retrying for late-filled cells)
+        return self.fetch_rows([row_id])
+
+    def get_row(self, row_id):
+        if row_id not in self.rows:
+            self.load([row_id])
+        return self.rows.get(row_id)
+
+
+class SheetReplica(RowSnapshot):
+    """
+    Live in-memory copy of a whole sheet: rows keyed by row id, cells keyed by
+    column id (CachedRow).
+
+    Loaded once, patched from webhook events and reconciled periodically with a
+    rowsModifiedSince delta sync.
+    """
+
+    # Overlap applied to rowsModifiedSince to tolerate clock skew with Smartsheet
+    SYNC_OVERLAP_SECONDS = 60
+
+    def __init__(self, smart_client, sheet_id, api_call, sync_interval=300, full_sync_interval=3600):
+        super().__init__(smart_client, sheet_id, [], api_call)
+        self.version = None
+        self.last_sync = None
+        self.last_full_sync = None
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.sync_thread = None
+
+    @staticmethod
+    def utc_now():
+        return datetime.datetime.now(datetime.timezone.utc)
+
+    def load_all(self):
+        # Full download of the sheet, replaces the replica contents
+        started = self.utc_now()
+        with self.lock:
+            self.changed_during_load = set()
+            self.api_calls += 1
+        try:
+            result = self.api_call(self.smart.Sheets.get_sheet, self.sheet_id)
+            if result is None:
+                return False
+            with self.lock:
+                rows = {row.id: CachedRow(row) for row in result.rows}
+                # Rows patched from webhooks during the download are newer than the download
+                for row_id in self.changed_during_load:
+                    if row_id in self.rows:
+                        rows[row_id] = self.rows[row_id]
+                    else:
+                        rows.pop(row_id, None)
+                self.columns = result.columns
+                self.rows = rows
+                for listener in self.listeners:
+                    listener.rows_replaced(rows)
+                self.version = result.version
+                self.last_sync = started
+                self.last_full_sync = started
+            return True
+        finally:
+            with self.lock:
+                self.changed_during_load = None
+
+    def delta_sync(self):
+        # Fetch only the rows modified since the last sync (skipped when the sheet version is unchanged)
+        if self.last_sync is None:
+            return self.load_all()
+
+        started = self.utc_now()
+        version = self.api_call(self.smart.Sheets.get_sheet_version, self.sheet_id)
+        with self.lock:
+            self.api_calls += 1
+        if version is not None and self.version is not None and version.version == self.version:
+            self.last_sync = started
+            return True
+
+        since = self.last_sync - datetime.timedelta(seconds=self.SYNC_OVERLAP_SECONDS)
+        result = self.api_call(self.smart.Sheets.get_sheet, self.sheet_id,
+                               rows_modified_since=since.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        with self.lock:
+            self.api_calls += 1
+        if result is None:
+            return False
+        self.columns = result.columns
+        self.store_rows(result.rows)
+        with self.lock:
+            self.version = result.version
+            self.last_sync = started
+        return True
+
+    def apply_events(self, events):
+        # Patch the replica from webhook events, returns the number of API calls made
+        schema_changed, changed_rows, deleted_rows = row_changes(events)
+        calls = 0
+        if schema_changed:
+            # Columns were added, renamed or deleted: re-read the schema once for the whole batch
+            self.schema.refresh()
+            calls += 1
+        self.drop_rows(deleted_rows)
+        calls += self.fetch_rows(changed_rows)
+        return calls
+
+    def sync_forever(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                full_sync_due = (self.last_full_sync is None or
+                                 (self.utc_now() - self.last_full_sync).total_seconds() >= self.full_sync_interval)
+                # A periodic full load also drops rows deleted while webhooks were not delivered
+                if full_sync_due:
+                    self.load_all()
+                else:
+                    self.delta_sync()
+            except Exception as e:
+                print(f"Sheet replica sync failed: {e}")
+
+    def start_sync(self):
+        if self.sync_thread is None:
+            self.sync_thread = threading.Thread(target=self.sync_forever, daemon=True)
+            self.sync_thread.start()
+
+
+class CachedValue:
+    """
+    Value built by loader() and served from memory for ttl seconds.
+
+    invalidate() (e.g. on a webhook) forces the next get() to reload. Concurrent
+    callers of an expired value share one load, and the last good value is
+    served if a reload fails.
+    """
+
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self.value = None
+        self.loaded_at = None
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'loads': 0,
+            'load_errors': 0,
+            'invalidations': 0,
+        }
+
+    def fresh(self):
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def get(self):
+        with self.lock:
+            if self.fresh():
+                self.stats['hits'] += 1
+                return self.value
+        with self.load_lock:
+            with self.lock:
+                # Another caller may have reloaded it while this one waited
+                if self.fresh():
+                    self.stats['hits'] += 1
+                    return self.value
+                generation = self.generation
+            try:
+                value = self.loader()
+            except Exception as e:
+                with self.lock:
+                    self.stats['load_errors'] += 1
+                    if self.value is None:
+                        raise
+                    print(f"Cache reload failed, serving the previous value: {e}")
+                    return self.value
+            with self.lock:
+                self.stats['loads'] += 1
+                self.value = value
+                # Invalidated during the load: keep the value but reload on the next call
+                self.loaded_at = time.monotonic() if generation == self.generation else None
+            return value
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.loaded_at = None
+            self.stats['invalidations'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['age_seconds'] = round(time.monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None
+        return stats
@@ -0,0 +1,77 @@
+import threading
+
+
+def freeze(value):
+    # Hashable form of call arguments (lists such as row_ids become tuples)
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def call_key(call, args, kwargs):
+    # Bound SDK methods are keyed by their owner: a model's id (e.g. a Sheet) or the API object itself
+    owner = getattr(call, '__self__', None)
+    owner_key = (type(owner).__name__, getattr(owner, 'id', None) or id(owner))
+    return owner_key, getattr(call, '__name__', repr(call)), freeze(args), freeze(kwargs)
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one: the first caller runs it and
+    everyone who asks for the same key meanwhile waits for and shares its result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {
+            'calls': 0,
+            'collapsed': 0,
+        }
+
+    def do(self, key, fn):
+        with self.lock:
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                self.in_flight[key] = flight
+                self.stats['calls'] += 1
+            else:
+                self.stats['collapsed'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self.in_flight)
+        return stats
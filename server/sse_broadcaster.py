@@ -0,0 +1,526 @@
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from itertools import count, islice
+
+
+# What to do with a client that falls further behind than its caps
+SLOW_CLIENT_POLICIES = ('drop_oldest', 'collapse', 'disconnect')
+
+
+def normalize_rep(rep):
+    # Reps are matched by username: 'JDoe@granitenet.com' and 'jdoe' are the same rep
+    return str(rep).strip().lower().split('@')[0]
+
+
+class StreamFilter:
+    """
+    What one stream subscribed to, compiled once when it connects.
+
+    Each criterion is a set of accepted values (empty: anything). Events carry
+    routing tags (equipment type, reps, action, escalated) and the column set
+    restricts which changed columns are sent. Streams with the same
+    subscription share a key, so an event is routed once per key.
+    """
+
+    # Fields of a ticket event sent whatever the column set
+    BASE_FIELDS = frozenset(('Equipment Ticket', 'Action', 'Action By', 'Timestamp'))
+
+    def __init__(self, equipment_types=(), reps=(), actions=(), escalated_only=False, columns=()):
+        self.equipment_types = frozenset(str(value).strip().lower() for value in equipment_types)
+        self.reps = frozenset(normalize_rep(rep) for rep in reps)
+        self.actions = frozenset(str(value).strip().lower() for value in actions)
+        self.escalated_only = bool(escalated_only)
+        self.columns = frozenset(columns) - self.BASE_FIELDS
+        self.key = (tuple(sorted(self.equipment_types)), tuple(sorted(self.reps)), tuple(sorted(self.actions)),
+                    self.escalated_only, tuple(sorted(self.columns)))
+
+    def __bool__(self):
+        return bool(self.equipment_types or self.reps or self.actions or self.escalated_only or self.columns)
+
+    @staticmethod
+    def tags(equipment_type=None, reps=(), action=None, escalated=False):
+        # Routing tags of an event, normalized the way the criteria are
+        return {
+            'equipment_type': str(equipment_type).strip().lower() if equipment_type else None,
+            'reps': frozenset(normalize_rep(rep) for rep in reps if rep),
+            'action': str(action).strip().lower() if action else None,
+            'escalated': bool(escalated),
+        }
+
+    def matches(self, tags):
+        if self.equipment_types and tags['equipment_type'] not in self.equipment_types:
+            return False
+        if self.reps and not self.reps & tags['reps']:
+            return False
+        if self.actions and tags['action'] not in self.actions:
+            return False
+        return tags['escalated'] or not self.escalated_only
+
+    def project(self, data):
+        # The event restricted to the column set, None for an update of none of those columns
+        if not self.columns:
+            return data
+        projected = {name: value for name, value in data.items() if name in self.BASE_FIELDS or name in self.columns}
+        if len(projected) == len(data):
+            return data
+        if data.get('Action') == 'updated' and not any(name in self.columns for name in projected):
+            return None
+        return projected
+
+    def describe(self):
+        return {
+            'equipment_types': sorted(self.equipment_types),
+            'reps': sorted(self.reps),
+            'actions': sorted(self.actions),
+            'escalated_only': self.escalated_only,
+            'columns': sorted(self.columns),
+        }
+
+
+class LogEntry:
+    """
+    One published event: its encoded frame and, for routable events, the data
+    and tags it was built from with the frame routed to each subscription.
+    """
+
+    __slots__ = ('frame', 'id_line', 'key', 'offset', 'published_at', 'data', 'tags', 'routes')
+
+    def __init__(self, frame, id_line, key, offset, published_at, data=None, tags=None):
+        self.frame = frame
+        self.id_line = id_line
+        self.key = key
+        self.offset = offset
+        self.published_at = published_at
+        self.data = data
+        self.tags = tags
+        # Subscription key -> frame sent to it (None: filtered out)
+        self.routes = {} if tags is not None else None
+
+
+class StreamClient:
+    """
+    One connected stream: its cursor in the broadcaster's log, its caps and policy,
+    and what it has been sent.
+    """
+
+    ids = count(1)
+
+    def __init__(self, cursor, policy, max_lag_events, max_lag_bytes, client_id=None, remote_addr=None,
+                 stream_filter=None, encoder=None):
+        self.id = next(self.ids)
+        self.cursor = cursor
+        self.filter = stream_filter
+        # Per-connection wire format (None: the shared frames as published)
+        self.encoder = encoder
+        self.policy = policy
+        self.max_lag_events = max_lag_events
+        self.max_lag_bytes = max_lag_bytes
+        self.client_id = client_id
+        self.remote_addr = remote_addr
+        self.connected_at = time.time()
+        self.last_write = None
+        self.stats = {
+            'sent_frames': 0,
+            'sent_bytes': 0,
+            'dropped': 0,
+            'collapsed': 0,
+            'overflows': 0,
+            'filtered': 0,
+        }
+
+    def sent(self, frames):
+        self.last_write = time.time()
+        self.stats['sent_frames'] += len(frames)
+        self.stats['sent_bytes'] += sum(len(frame) for frame in frames)
+
+
+class SseBroadcaster:
+    """
+    Fan-out of encoded SSE frames to every connected client, without per-client queues.
+
+    Each frame is appended once to a ring buffer (bounded by count and age) and
+    stamped with an increasing event id. Clients keep a cursor and block on a
+    shared condition until something newer is published, so idle clients cost
+    no wakeups besides their keep-alive. A reconnect with Last-Event-ID resumes
+    right after that id while it is still buffered.
+
+    A client's memory is what it has not consumed yet (its lag). When the lag
+    exceeds the client's caps, its policy drops the oldest frames, merges the
+    frames of each key (ticket) into one, or disconnects it with a resync hint.
+
+    Events published with data and tags can be filtered per client: each
+    distinct subscription (StreamFilter key) gets the event's frame, or None,
+    decided once at publish and looked up by every client sharing it. encode
+    builds the frame of a column-restricted copy of the data.
+    """
+
+    def __init__(self, history=1000, max_age=None, first_id=None, encode=None):
+        # LogEntry per event id, oldest first
+        self.log = deque(maxlen=history)
+        self.encode = encode
+        self.max_age = max_age
+        # Ids start from the clock so they keep increasing across server restarts
+        self.next_seq = first_id if first_id is not None else int(time.time() * 1000)
+        self.total_bytes = 0
+        self.clients = {}
+        # Subscription key -> [StreamFilter, connected clients using it]
+        self.filters = {}
+        # Called after every publish, outside the lock (e.g. to wake asyncio streams)
+        self.publish_hooks = []
+        # A plain Lock is cheaper than the default RLock, reads happen once per client per update
+        self.condition = threading.Condition(threading.Lock())
+        self.stats = {
+            'published': 0,
+            'skipped': 0,
+            'resumed': 0,
+            'resume_gaps': 0,
+            'slow_disconnects': 0,
+            'rebases': 0,
+        }
+
+    def expire(self, now):
+        # Drop frames older than max_age (count is bounded by the deque itself)
+        while self.log and self.max_age is not None and now - self.log[0].published_at > self.max_age:
+            self.log.popleft()
+
+    def rebase_locked(self, event_id):
+        # Ids assigned elsewhere (the event bus) no longer follow on: restart the log at event_id
+        if self.log:
+            self.stats['rebases'] += 1
+        self.log.clear()
+        self.next_seq = event_id
+        for client in self.clients.values():
+            client.cursor = event_id
+
+    def publish(self, frame, key=None, data=None, tags=None, event_id=None):
+        with self.condition:
+            now = time.monotonic()
+            self.expire(now)
+            if event_id is not None and event_id != self.next_seq:
+                self.rebase_locked(event_id)
+            id_line = f"id: {self.next_seq}\n".encode('utf-8')
+            entry = LogEntry(id_line + frame, id_line, key, self.total_bytes, now, data, tags)
+            # Route to the current subscriptions now, readers only look their frame up
+            for stream_filter, _ in self.filters.values():
+                self.route_locked(entry, stream_filter)
+            self.log.append(entry)
+            self.total_bytes += len(entry.frame)
+            self.next_seq += 1
+            self.stats['published'] += 1
+            self.condition.notify_all()
+        for hook in self.publish_hooks:
+            hook()
+
+    def route_locked(self, entry, stream_filter):
+        # Frame of an entry for a subscription (None: filtered out), decided once per entry and subscription
+        if entry.routes is None:
+            return entry.frame
+        try:
+            return entry.routes[stream_filter.key]
+        except KeyError:
+            pass
+        frame = None
+        if stream_filter.matches(entry.tags):
+            data = stream_filter.project(entry.data)
+            if data is entry.data:
+                frame = entry.frame
+            elif data is not None:
+                frame = entry.id_line + self.encode(data)
+        entry.routes[stream_filter.key] = frame
+        return frame
+
+    def connect(self, last_event_id=None, replay=0, policy='drop_oldest', max_lag_events=500,
+                max_lag_bytes=1 << 20, client_id=None, remote_addr=None, stream_filter=None, encoder=None):
+        # New client positioned right after last_event_id when resuming, else before the last `replay` frames
+        with self.condition:
+            self.expire(time.monotonic())
+            oldest = self.next_seq - len(self.log)
+            if last_event_id is not None and last_event_id < self.next_seq:
+                self.stats['resumed'] += 1
+                if last_event_id + 1 < oldest:
+                    # Part of what was missed is no longer buffered, send everything that is
+                    self.stats['resume_gaps'] += 1
+                cursor = max(oldest, last_event_id + 1)
+            else:
+                cursor = max(oldest, self.next_seq - replay)
+            if stream_filter:
+                # Clients with the same subscription share one filter, and its routes
+                subscription = self.filters.setdefault(stream_filter.key, [stream_filter, 0])
+                subscription[1] += 1
+                stream_filter = subscription[0]
+            else:
+                stream_filter = None
+            client = StreamClient(cursor, policy, max_lag_events, max_lag_bytes, client_id, remote_addr,
+                                  stream_filter, encoder)
+            self.clients[client.id] = client
+            return client
+
+    def disconnect(self, client):
+        with self.condition:
+            if self.clients.pop(client.id, None) is not None and client.filter is not None:
+                subscription = self.filters[client.filter.key]
+                subscription[1] -= 1
+                if not subscription[1]:
+                    del self.filters[client.filter.key]
+
+    def lag_locked(self, cursor):
+        # Frames and bytes published after cursor
+        oldest = self.next_seq - len(self.log)
+        if cursor >= self.next_seq:
+            return 0, 0
+        if not self.log:
+            # Everything after cursor has expired, it will be skipped without being sent
+            return self.next_seq - cursor, 0
+        cursor = max(cursor, oldest)
+        return self.next_seq - cursor, self.total_bytes - self.log[cursor - oldest].offset
+
+    def read_locked(self, client):
+        # (frame, entry) the client has not seen yet, after its slow-consumer policy (None: disconnect it)
+        oldest = self.next_seq - len(self.log)
+        if client.cursor < oldest:
+            self.stats['skipped'] += oldest - client.cursor
+            client.stats['dropped'] += oldest - client.cursor
+            client.cursor = oldest
+        if client.cursor == self.next_seq:
+            return []
+        if client.cursor == self.next_seq - 1:
+            client.cursor = self.next_seq
+            entry = self.log[-1]
+            frame = entry.frame if client.filter is None else self.route_locked(entry, client.filter)
+            if frame is None:
+                client.stats['filtered'] += 1
+                return []
+            return [(frame, entry)]
+
+        start = client.cursor - oldest
+        entries = islice(self.log, start, None)
+        client.cursor = self.next_seq
+        if client.filter is None:
+            entries = [(entry.frame, entry) for entry in entries]
+            lag_bytes = self.total_bytes - self.log[start].offset
+        else:
+            # Entries routed to the client's subscription
+            routed = [(self.route_locked(entry, client.filter), entry) for entry in entries]
+            entries = [entry for entry in routed if entry[0] is not None]
+            client.stats['filtered'] += len(routed) - len(entries)
+            lag_bytes = sum(len(entry[0]) for entry in entries)
+        if len(entries) <= client.max_lag_events and lag_bytes <= client.max_lag_bytes:
+            return entries
+
+        client.stats['overflows'] += 1
+        if client.policy == 'disconnect':
+            self.stats['slow_disconnects'] += 1
+            return None
+        if client.policy == 'collapse':
+            # One frame per ticket at its latest position, in publish order (frames without a key are all kept)
+            groups = {}
+            for index, entry in enumerate(entries):
+                groups.setdefault(entry[1].key if entry[1].key is not None else ('index', index), []).append(index)
+            kept = [self.collapse_locked([entries[index] for index in group], client.filter)
+                    for group in sorted(groups.values(), key=lambda group: group[-1])]
+            client.stats['collapsed'] += len(entries) - len(kept)
+            entries = kept
+        # Whatever is still over the caps: keep the newest frames
+        kept = []
+        size = 0
+        for entry in reversed(entries):
+            size += len(entry[0])
+            if len(kept) >= client.max_lag_events or (kept and size > client.max_lag_bytes):
+                break
+            kept.append(entry)
+        client.stats['dropped'] += len(entries) - len(kept)
+        return kept[::-1]
+
+    def collapse_locked(self, entries, stream_filter):
+        # One (frame, entry) for a ticket's entries: their data merged (later values win) under the last id
+        frame, last = entries[-1]
+        if len(entries) == 1 or self.encode is None or any(entry.data is None for _, entry in entries):
+            return frame, last
+        data = {}
+        for _, entry in entries:
+            data.update(entry.data)
+        merged = LogEntry(None, last.id_line, last.key, last.offset, last.published_at, data)
+        projected = stream_filter.project(data) if stream_filter is not None else data
+        merged.frame = last.id_line + self.encode(projected)
+        return merged.frame, merged
+
+    def pending(self, client):
+        # Whether anything was published after the client's cursor (no lock, a stale answer only delays a read)
+        return client.cursor < self.next_seq
+
+    @staticmethod
+    def frames(client, entries):
+        # Bytes to send: the shared frames, or the client's own encoding of them (outside the lock)
+        if entries is None:
+            return None
+        if client.encoder is None:
+            return [frame for frame, _ in entries]
+        return [client.encoder.encode(frame, entry, client.filter) for frame, entry in entries]
+
+    def read(self, client):
+        with self.condition:
+            entries = self.read_locked(client)
+        return self.frames(client, entries)
+
+    def wait(self, client, timeout):
+        # Block until something the client subscribed to is published (or timeout), then return it
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                entries = self.read_locked(client)
+                remaining = deadline - time.monotonic()
+                if entries != [] or remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+        return self.frames(client, entries)
+
+    def last_event_id(self):
+        with self.condition:
+            return self.next_seq - 1
+
+    def client_snapshots(self):
+        # Per-client lag (frames and bytes retained for it), policy and traffic
+        now = time.time()
+        with self.condition:
+            snapshots = []
+            for client in self.clients.values():
+                lag_events, lag_bytes = self.lag_locked(client.cursor)
+                snapshot = dict(client.stats)
+                snapshot.update({
+                    'id': client.id,
+                    'client_id': client.client_id,
+                    'remote_addr': client.remote_addr,
+                    'policy': client.policy,
+                    'filter': client.filter.describe() if client.filter is not None else None,
+                    'format': client.encoder.name if client.encoder is not None else 'json',
+                    'connected_seconds': round(now - client.connected_at, 1),
+                    'idle_seconds': round(now - client.last_write, 1) if client.last_write else None,
+                    'lag_events': lag_events,
+                    'lag_bytes': lag_bytes,
+                })
+                snapshots.append(snapshot)
+        return snapshots
+
+    def snapshot(self):
+        with self.condition:
+            stats = dict(self.stats)
+            stats['clients'] = len(self.clients)
+            stats['buffered'] = len(self.log)
+            stats['buffered_bytes'] = self.total_bytes - self.log[0].offset if self.log else 0
+            stats['subscriptions'] = len(self.filters)
+            stats['last_event_id'] = self.next_seq - 1
+        return stats
+
+
+class FlushPacer:
+    """
+    Adaptive flushing for one client: a lone update is sent at once, updates
+    arriving faster than max_rate per second are held and sent together.
+    """
+
+    def __init__(self, max_rate):
+        self.min_interval = 1 / max_rate if max_rate else 0
+        self.last_flush = 0
+
+    def hold(self):
+        # Seconds to wait before the next flush (0 when the client has been quiet long enough)
+        return max(0, self.last_flush + self.min_interval - time.monotonic())
+
+    def flushed(self):
+        self.last_flush = time.monotonic()
+
+
+class CompactEncoder:
+    """
+    Compact wire format of one connection (/stream?format=compact).
+
+    Field names are sent once, then referred to by index, and a ticket event
+    only carries the values that differ from the last state sent for that
+    ticket: "f" lists the event's fields in order, an index alone for an
+    unchanged value, [index, value] for a new one. "k" declares new field
+    names and "r" (first message of a connection) resets the client's
+    dictionary and states. Frames without data (metrics, ...) pass through.
+    """
+
+    name = 'compact'
+
+    def __init__(self, max_tickets=1000):
+        self.keys = {}
+        # Last values sent per ticket, least recently sent first
+        self.states = OrderedDict()
+        self.max_tickets = max_tickets
+        self.started = False
+
+    def encode(self, frame, entry, stream_filter=None):
+        if entry.data is None:
+            return frame
+        data = stream_filter.project(entry.data) if stream_filter is not None else entry.data
+        ticket = data.get('Equipment Ticket')
+        state = self.states.pop(ticket, None) or {}
+        message = {}
+        if not self.started:
+            message['r'] = 1
+            self.started = True
+        message['t'] = ticket
+        new_keys = []
+        fields = []
+        for name, value in data.items():
+            if name == 'Equipment Ticket':
+                continue
+            index = self.keys.get(name)
+            if index is None:
+                index = self.keys[name] = len(self.keys)
+                new_keys.append(name)
+            if name in state and state[name] == value:
+                fields.append(index)
+            else:
+                fields.append([index, value])
+                state[name] = value
+        # A forgotten ticket is simply sent in full next time
+        self.states[ticket] = state
+        if len(self.states) > self.max_tickets:
+            self.states.popitem(last=False)
+        if new_keys:
+            message['k'] = new_keys
+        message['f'] = fields
+        return entry.id_line + f"event: delta\ndata: {json.dumps(message, separators=(',', ':'))}\n\n".encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding):
+    # gzip or deflate when the client's Accept-Encoding allows it, else None
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ('gzip', 'deflate'):
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+class StreamCompressor:
+    """
+    Streaming gzip/deflate of one SSE response. Every batch is flushed
+    (Z_SYNC_FLUSH) so the client decodes it at once, while the dictionary
+    spans the whole stream.
+    """
+
+    # 8 KB window and a small memLevel: about 64 KB per connection instead of 256 KB
+    WINDOW_BITS = 13
+    MEM_LEVEL = 6
+
+    def __init__(self, encoding, level=6):
+        window_bits = self.WINDOW_BITS + 16 if encoding == 'gzip' else self.WINDOW_BITS
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, window_bits, self.MEM_LEVEL)
+
+    def compress(self, chunk):
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
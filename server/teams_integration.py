@@ -5,7 +5,7 @@ import json
 import webbrowser
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import urlparse, parse_qs
-from threading import Thread, Event
+from threading import Thread, Event, Lock
 import uuid
 import time
 
@@ -22,6 +22,31 @@ def escape_values_in_dict(data_dict):
 
 
 class TeamsIntegration:
+    """
+    Graph client for a Teams channel. Use TeamsIntegration.shared() so the
+    whole process reuses one MSAL app, one HTTP session and one token.
+
+    The token is kept in memory with its absolute expiry (expires_on) and
+    refreshed in the background shortly before it expires; token.json is
+    only written when the token changes.
+    """
+
+    # Shared instances per (team_id, channel_id)
+    instances = {}
+    instances_lock = Lock()
+    # A token this close to expiry is not handed out
+    EXPIRY_MARGIN_SECONDS = 60
+    # The background refresh runs this long before expiry, and retries after a failure this often
+    REFRESH_MARGIN_SECONDS = 300
+    REFRESH_RETRY_SECONDS = 60
+
+    @classmethod
+    def shared(cls, team_id, channel_id):
+        with cls.instances_lock:
+            if (team_id, channel_id) not in cls.instances:
+                cls.instances[(team_id, channel_id)] = cls(team_id, channel_id)
+            return cls.instances[(team_id, channel_id)]
+
     def __init__(self, team_id, channel_id):
         self.tenant_id = os.getenv('TEAMS_TENANT_ID')
         self.client_id = os.getenv('TEAMS_CLIENT_ID')
@@ -43,6 +68,11 @@ class TeamsIntegration:
         self.token_response = None
         # Add an event object for synchronization
         self.auth_completed_event = Event()
+        # Current token (in memory) and the last one written to token.json
+        self.token = None
+        self.saved_token = None
+        self.token_lock = Lock()
+        self.refresh_thread = None
 
     def start_http_server(self, port=8888):
         server_address = ("127.0.0.1", port)
@@ -54,24 +84,73 @@ class TeamsIntegration:
         httpd.handle_request()
 
     def authenticate(self):
-        token_response = self.load_token_from_file()
+        # The in-memory token while it is valid: no disk read and no Graph call
+        token_response = self.cached_token()
+        if token_response:
+            return token_response
 
-        if token_response and 'access_token' in token_response:
-            if not self.is_token_expired(token_response) and self.test_token_validity(token_response):
+        with self.token_lock:
+            # Another thread may have refreshed it while this one waited
+            token_response = self.cached_token()
+            if token_response:
                 return token_response
-            elif 'refresh_token' in token_response:
-                silent_response = self.acquire_token_by_refresh_token(token_response['refresh_token'])
-                if silent_response:
-                    return silent_response
 
-        print("Attempting interactive token acquisition.")
-        return self.acquire_new_token()
+            token_response = self.token or self.load_token_from_file()
+            if token_response and 'access_token' in token_response:
+                if not self.is_token_expired(token_response, self.EXPIRY_MARGIN_SECONDS) and \
+                        self.test_token_validity(token_response):
+                    return self.use_token(token_response)
+                elif 'refresh_token' in token_response:
+                    silent_response = self.acquire_token_by_refresh_token(token_response['refresh_token'])
+                    if silent_response:
+                        return silent_response
+
+            print("Attempting interactive token acquisition.")
+            return self.acquire_new_token()
+
+    def cached_token(self):
+        # The in-memory token unless it is about to expire (no I/O, safe to call from an event loop)
+        token_response = self.token
+        if token_response is not None and not self.is_token_expired(token_response, self.EXPIRY_MARGIN_SECONDS):
+            return token_response
+        return None
+
+    def use_token(self, token_response):
+        # Make a token current: absolute expiry, memory, token.json (if changed) and background refresh
+        if 'expires_on' not in token_response and 'expires_in' in token_response:
+            token_response['expires_on'] = int(time.time()) + int(token_response['expires_in'])
+        self.token = token_response
+        self.save_token_to_file(token_response)
+        self.start_refresh()
+        return token_response
+
+    def start_refresh(self):
+        if self.refresh_thread is None and 'refresh_token' in self.token:
+            self.refresh_thread = Thread(target=self.refresh_forever, daemon=True)
+            self.refresh_thread.start()
+
+    def refresh_forever(self):
+        # Refresh the token shortly before it expires, so callers never wait for one
+        while True:
+            with self.token_lock:
+                token_response = self.token
+                if token_response is None or 'refresh_token' not in token_response:
+                    self.refresh_thread = None
+                    return
+            refresh_at = int(token_response.get('expires_on', 0)) - self.REFRESH_MARGIN_SECONDS
+            time.sleep(max(refresh_at - time.time(), 0))
+            with self.token_lock:
+                # Nothing to do if a caller already replaced it
+                refreshed = self.token is not token_response or \
+                    self.acquire_token_by_refresh_token(token_response['refresh_token']) is not None
+            if not refreshed:
+                time.sleep(self.REFRESH_RETRY_SECONDS)
 
     def acquire_token_by_refresh_token(self, refresh_token):
         token_response = self.app.acquire_token_by_refresh_token(refresh_token, scopes=self.scope)
 
         if "access_token" in token_response:
-            self.save_token_to_file(token_response)
+            self.use_token(token_response)
             print("Refresh token acquired!")
             return token_response
         else:
@@ -99,32 +178,35 @@ class TeamsIntegration:
             return True
 
     def save_token_to_file(self, token_response):
+        # Only when the token changed
+        if token_response == self.saved_token:
+            return
         with open(self.token_file_path, 'w') as file:
             json.dump(token_response, file)
             # print("Token saved to file.")
+        self.saved_token = dict(token_response)
 
     def load_token_from_file(self):
         if os.path.exists(self.token_file_path):
             with open(self.token_file_path, 'r') as file:
-                return json.load(file)
+                token_response = json.load(file)
+            # Files written before expires_on was stored: expires_in counts from when the file was written
+            if 'expires_on' not in token_response and 'expires_in' in token_response:
+                token_response['expires_on'] = int(os.path.getmtime(self.token_file_path)) + \
+                    int(token_response['expires_in'])
+            self.saved_token = dict(token_response)
+            return token_response
         return None
 
-    def is_token_expired(self, token_response):
+    def is_token_expired(self, token_response, margin=0):
+        # Compared with the absolute expiration time ('expires_on') stamped when the token was acquired
         try:
-            expiration_seconds = int(token_response['expires_in'])
-        except KeyError:
-            print("Error: 'expires_in' not found in token response.")
+            expires_on = int(token_response['expires_on'])
+        except (KeyError, TypeError, ValueError):
+            print("Error: 'expires_on' not found in token response.")
             return False
 
-        current_timestamp = int(time.time())
-
-        if expiration_seconds <= 0:
-            return 'refresh_token' not in token_response
-
-        # Calculate the absolute expiration time ('expires_on')
-        expires_on = current_timestamp + expiration_seconds
-
-        return current_timestamp >= expires_on
+        return time.time() + margin >= expires_on
 
     def acquire_new_token(self):
         max_retries = 3  # Set a maximum number of retry attempts
@@ -146,9 +228,8 @@ class TeamsIntegration:
 
             # Check if the authentication was completed and token response is available
             if auth_completed and self.token_response:
-                # Save the token to the file
-                self.save_token_to_file(self.token_response)
-                return self.token_response
+                # Keep it in memory and save it to the file
+                return self.use_token(self.token_response)
             else:
                 print("Error: Authentication may not have been completed. Retrying in {retry_delay} seconds...")
                 time.sleep(retry_delay)
@@ -156,48 +237,49 @@ class TeamsIntegration:
         print("Error: Authentication failed after multiple retries.")
         return None
 
-    def get_user_info(self, username):
-        token_response = self.authenticate()
+    @staticmethod
+    def user_lookup_params(username):
+        # Graph query parameters for a Smartsheet username (a few accounts differ in Azure AD)
         if username == "swong":
             username = "stwong"
         if username == "jaroth":
             username = "jroth"
+        return {
+            "$filter": f"userPrincipalName eq '{username}@granitenet.com'"
+        }
+
+    @staticmethod
+    def parse_user_info(user_info):
+        if 'value' in user_info and len(user_info['value']) > 0:
+            user = user_info['value'][0]
+            return {
+                "id": user.get("id", ""),
+                "userPrincipalName": user.get("userPrincipalName", ""),
+                "displayName": user.get("displayName", "")
+            }
+        else:
+            # print(f"Response JSON: {json.dumps(user_info, indent=2)}")  # Add this line for debugging
+            return None
+
+    def get_user_info(self, username):
+        token_response = self.authenticate()
         graph_url = "https://graph.microsoft.com/v1.0/users"
         headers = {
             "Authorization": f"Bearer {token_response['access_token']}",
             "Accept": "application/json"
         }
-        params = {
-            "$filter": f"userPrincipalName eq '{username}@granitenet.com'"
-        }
+        params = self.user_lookup_params(username)
 
         response = self.session.get(graph_url, headers=headers, params=params)
 
         if response.status_code == 200:
-            user_info = response.json()
-            if 'value' in user_info and len(user_info['value']) > 0:
-                user = user_info['value'][0]
-                return {
-                    "id": user.get("id", ""),
-                    "userPrincipalName": user.get("userPrincipalName", ""),
-                    "displayName": user.get("displayName", "")
-                }
-            else:
-                # print(f"Error: User not found for username {username}")
-                # print(f"Response JSON: {json.dumps(user_info, indent=2)}")  # Add this line for debugging
-                return None
+            return self.parse_user_info(response.json())
         else:
             # print(f"Error: {response.status_code}, {response.text}")
             return None
 
     def send_adaptive_card(self, template_path, dynamic_data, retry_count):
         dynamic_data = escape_values_in_dict(dynamic_data)
-        # Read the Adaptive Card template from the provided file
-        with open(template_path, 'r', encoding='utf-8') as template_file:
-            adaptive_card_template = json.load(template_file)
-
-        # Generate a unique ID for the Adaptive Card
-        card_id = str(uuid.uuid4())
         # Fetch user information
         try:
             prov_rep_info = self.get_user_info(dynamic_data.get('prov_rep', ''))
@@ -210,6 +292,16 @@ class TeamsIntegration:
             if retry_count == 3:
                 conf_rep_info = ''
 
+        payload = self.build_adaptive_card_payload(template_path, dynamic_data, prov_rep_info, conf_rep_info)
+
+        # Send the payload
+        self.send_html_message(payload)
+
+    def build_adaptive_card_payload(self, template_path, dynamic_data, prov_rep_info, conf_rep_info):
+        # Read the Adaptive Card template from the provided file
+        with open(template_path, 'r', encoding='utf-8') as template_file:
+            adaptive_card_template = json.load(template_file)
+
         # Replace placeholders in the Adaptive Card template with dynamic data
         dynamic_data["prov_rep_display"] = prov_rep_info.get('displayName', '')
         dynamic_data["conf_rep_display"] = conf_rep_info.get('displayName', '')
@@ -271,8 +363,7 @@ class TeamsIntegration:
         # print("Payload:")
         # print(json.dumps(payload, indent=2))
 
-        # Send the payload
-        self.send_html_message(payload)
+        return payload
 
     def recursive_replace(self, obj, data):
         if isinstance(obj, dict):
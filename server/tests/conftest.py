@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+import smartsheet
+
+# The server modules are imported flat, as app.py does when run from server/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    # app.py imported once, against an in-memory Smartsheet and temporary state files
+    from fake_smartsheet import FakeSmartsheet
+
+    state = tmp_path_factory.mktemp('server')
+    patcher = pytest.MonkeyPatch()
+    patcher.setattr(smartsheet, 'Smartsheet', FakeSmartsheet)
+    patcher.setenv('WEBHOOK_INBOX_PATH', str(state / 'webhook_inbox.db'))
+    patcher.setenv('SCHEMA_CACHE_PATH', str(state / 'sheet_schema.json'))
+    import app
+    yield app
+    patcher.undo()
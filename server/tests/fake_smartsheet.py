@@ -0,0 +1,57 @@
+import types
+
+import smartsheet
+from smartsheet.models import Column, Row, Sheet
+
+from kpi_engine import KPI_COLUMNS
+
+# Equipment sheet columns read by the server (the KPI columns included, for KPI_SOURCE=local)
+TITLES = list(dict.fromkeys(['Equipment Ticket', 'Status', 'Equipment Type', 'Prov Username', 'Config Lab Rep',
+                             'Escalated Order', 'Serial Number(s)', *KPI_COLUMNS.values()]))
+
+
+class FakeSheets:
+    def __init__(self, client):
+        self.client = client
+        self.columns = [Column({'id': 1000 + index, 'title': title, 'index': index, 'type': 'TEXT_NUMBER'})
+                        for index, title in enumerate(TITLES)]
+        self.rows = {}
+
+    def get_sheet(self, sheet_id, row_ids=None, column_ids=None, **kwargs):
+        sheet = Sheet({'id': sheet_id, 'version': 1, 'columns': [column.to_dict() for column in self.columns]},
+                      base_obj=self.client)
+        sheet.rows = [self.rows[row_id].to_dict() for row_id in (row_ids or self.rows) if row_id in self.rows]
+        return sheet
+
+    def get_row(self, sheet_id, row_id, **kwargs):
+        return self.rows.get(row_id)
+
+    def get_columns(self, sheet_id, **kwargs):
+        return types.SimpleNamespace(data=self.columns, total_count=len(self.columns))
+
+    def get_sheet_version(self, sheet_id):
+        return types.SimpleNamespace(version=1)
+
+    def add_row(self, row_id, values):
+        self.rows[row_id] = Row({'id': row_id, 'cells': [
+            {'columnId': column.id, 'value': values.get(column.title)} for column in self.columns]})
+
+
+class FakeUsers:
+    def list_users(self, **kwargs):
+        return types.SimpleNamespace(data=[], total_pages=1)
+
+
+class FakeSmartsheet:
+    """
+    In-memory stand-in for the Smartsheet SDK client, enough for app.py to
+    start and serve without network access.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.Sheets = FakeSheets(self)
+        self.Users = FakeUsers()
+        self.models = smartsheet.models
+
+    def errors_as_exceptions(self, value):
+        pass
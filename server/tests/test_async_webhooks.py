@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+
+class ReplicaOnlyClient:
+    # The rows a payload changed were not fetched, so the replica misses them
+    async def apply_events(self, replica, events):
+        return 0
+
+
+def test_replica_misses_do_not_block_the_event_loop(server, monkeypatch):
+    sheets = server.smart.Sheets
+    row_id = 4242
+    sheets.add_row(row_id, {'Equipment Ticket': 'EQ-4242', 'Status': 'Open'})
+    get_sheet = sheets.get_sheet
+
+    def slow_get_sheet(*args, **kwargs):
+        time.sleep(0.3)
+        return get_sheet(*args, **kwargs)
+
+    monkeypatch.setattr(sheets, 'get_sheet', slow_get_sheet)
+    monkeypatch.setattr(server, 'async_smartsheet', ReplicaOnlyClient(), raising=False)
+    status_column = server.sheet_replica.schema.column_id('Status')
+    payload = {'webhookId': 1, 'scopeObjectId': server.SMARTSHEET_SHEET_ID, 'events': [
+        {'objectType': 'row', 'eventType': 'updated', 'id': row_id, 'timestamp': '2026-10-18T12:00:00Z'},
+        {'objectType': 'cell', 'eventType': 'updated', 'rowId': row_id, 'columnId': status_column,
+         'timestamp': '2026-10-18T12:00:00Z'},
+    ]}
+
+    async def run():
+        stalls = []
+
+        async def ticker():
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(0.01)
+                stalls.append(time.monotonic() - started)
+
+        ticking = asyncio.create_task(ticker())
+        await server.process_webhook_async(payload)
+        ticking.cancel()
+        return stalls
+
+    stalls = asyncio.run(run())
+    assert server.sheet_replica.rows.get(row_id) is not None
+    assert max(stalls) < 0.2
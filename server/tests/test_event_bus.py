@@ -0,0 +1,111 @@
+import json
+import socket
+import threading
+import time
+
+from event_bus import SocketBroker, SocketEventBus
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_only_one_broker_binds_the_port():
+    port = free_port()
+    first = SocketBroker(port)
+    assert first.acquire()
+    try:
+        assert not SocketBroker(port).acquire()
+    finally:
+        first.server.close()
+
+
+def test_workers_deliver_the_same_events_in_the_same_order():
+    port = free_port()
+    workers = [SocketEventBus(port, history=100) for _ in range(3)]
+    received = [[] for _ in workers]
+    for bus, events in zip(workers, received):
+        bus.subscribe(lambda seq, event, events=events: events.append((seq, event)))
+        bus.start()
+    assert sum(bus.broker is not None for bus in workers) == 1
+
+    def publish(bus, name):
+        for index in range(20):
+            bus.publish({'worker': name, 'index': index})
+
+    threads = [threading.Thread(target=publish, args=(bus, name)) for name, bus in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wait_until(lambda: all(len(events) == 60 for events in received))
+    assert received[1] == received[0] and received[2] == received[0]
+    seqs = [seq for seq, _ in received[0]]
+    assert seqs == list(range(seqs[0], seqs[0] + 60))
+
+
+def started_broker(**kwargs):
+    broker = SocketBroker(free_port(), **kwargs)
+    assert broker.acquire()
+    broker.start()
+    return broker
+
+
+def attach(broker, since):
+    sock = socket.create_connection((broker.host, broker.port), timeout=5)
+    sock.sendall(json.dumps({'since': since}).encode('utf-8') + b'\n')
+    return sock, sock.makefile('rb')
+
+
+def test_a_worker_reading_its_replay_slowly_does_not_hold_up_publish():
+    broker = started_broker(history=200)
+    for index in range(200):
+        broker.publish({'index': index, 'padding': 'x' * 65536})
+    sock, _ = attach(broker, None)
+    try:
+        # Never reads: its replay stalls once the socket buffers are full
+        assert wait_until(lambda: broker.attaching)
+        time.sleep(0.2)
+        started = time.monotonic()
+        broker.publish({'index': 200})
+        assert time.monotonic() - started < 0.5
+    finally:
+        sock.close()
+        broker.server.close()
+
+
+def test_a_worker_behind_the_history_gets_a_resync_then_what_is_left():
+    broker = started_broker(history=2)
+    first = broker.next_seq
+    for index in range(5):
+        broker.publish({'index': index})
+    sock, lines = attach(broker, first)
+    try:
+        assert json.loads(lines.readline()) == {'resync': first}
+        assert [json.loads(lines.readline())['seq'] for _ in range(2)] == [first + 3, first + 4]
+    finally:
+        sock.close()
+        broker.server.close()
+
+
+def test_a_worker_ahead_of_a_new_broker_moves_its_numbering_on():
+    broker = started_broker()
+    ahead = broker.next_seq + 1000
+    sock, lines = attach(broker, ahead)
+    try:
+        assert json.loads(lines.readline()) == {'resync': ahead}
+        assert wait_until(lambda: broker.snapshot()['workers'] == 1 and not broker.attaching)
+        broker.publish({'index': 0})
+        assert json.loads(lines.readline())['seq'] == ahead + 1
+    finally:
+        sock.close()
+        broker.server.close()
@@ -0,0 +1,65 @@
+import datetime
+import json
+import os
+
+import pytz
+import smartsheet
+
+from kpi_engine import KpiEngine, KPI_COLUMNS, KPI_CLOSED_STATUSES
+from sheet_cache import ColumnRegistry
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'kpi_rows.json')
+
+
+def load_fixture():
+    with open(FIXTURE_PATH, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def fixture_engine(monkeypatch, fixture, columns=KPI_COLUMNS):
+    today = datetime.date.fromisoformat(fixture['today'])
+    monkeypatch.setattr(KpiEngine, 'today', lambda self: today)
+    schema = ColumnRegistry([smartsheet.models.Column(column) for column in fixture['columns']])
+    return KpiEngine(schema, columns, KPI_CLOSED_STATUSES, pytz.timezone('US/Eastern')), schema
+
+
+def fixture_rows(fixture, schema):
+    return {
+        index: smartsheet.models.Row({
+            'id': index,
+            'cells': [{'columnId': schema.by_title[title], 'value': value} for title, value in values.items()],
+        })
+        for index, values in enumerate(fixture['rows'], start=1)
+    }
+
+
+def test_local_kpis_of_the_fixture_rows(monkeypatch):
+    # Expected values worked out by hand from the fixture rows; agreement with the real formula sheet
+    # is what /api/stats?check_kpis=1 reports
+    fixture = load_fixture()
+    engine, schema = fixture_engine(monkeypatch, fixture)
+    assert engine.missing_columns() == []
+    engine.rows_replaced(fixture_rows(fixture, schema))
+    assert engine.values() == fixture['expected']
+    assert engine.differences(fixture['expected']) == {}
+
+
+def test_row_changes_keep_matching_a_full_rebuild(monkeypatch):
+    fixture = load_fixture()
+    engine, schema = fixture_engine(monkeypatch, fixture)
+    rows = fixture_rows(fixture, schema)
+    engine.rows_replaced({})
+    for row_id, row in rows.items():
+        engine.row_changed(row_id, row)
+    engine.row_changed(3, None)
+    del rows[3]
+    rebuilt, _ = fixture_engine(monkeypatch, fixture)
+    rebuilt.rows_replaced(rows)
+    assert engine.values() == rebuilt.values()
+
+
+def test_missing_kpi_columns_are_reported(monkeypatch):
+    fixture = load_fixture()
+    columns = dict(KPI_COLUMNS, shipped='Actual Ship Date')
+    engine, _ = fixture_engine(monkeypatch, fixture, columns)
+    assert engine.missing_columns() == ['Actual Ship Date']
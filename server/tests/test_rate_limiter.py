@@ -0,0 +1,94 @@
+import types
+
+import pytest
+from smartsheet.exceptions import ApiError
+
+import rate_limiter
+from rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', fake)
+    return fake
+
+
+def test_the_bucket_refills_at_its_rate_up_to_its_capacity(clock):
+    limiter = RateLimiter(rate=2, capacity=3)
+    assert [limiter.try_acquire() for _ in range(3)] == [0, 0, 0]
+    assert limiter.try_acquire() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert limiter.try_acquire() == 0
+    clock.advance(60)
+    assert [limiter.try_acquire() for _ in range(4)] == [0, 0, 0, pytest.approx(0.5)]
+
+
+def test_a_rate_limit_error_pauses_every_caller_and_halves_the_rate(clock):
+    limiter = RateLimiter(rate=2, capacity=3, default_pause=60)
+    limiter.throttle()
+    # Tokens left in the bucket are dropped and none accumulate during the pause
+    assert limiter.try_acquire() == pytest.approx(60)
+    clock.advance(60)
+    assert limiter.try_acquire() == pytest.approx(1)
+    clock.advance(1)
+    assert limiter.try_acquire() == 0
+    assert limiter.snapshot()['rate_per_second'] == 1
+    # Successful calls bring the rate back gradually
+    limiter.success()
+    assert limiter.snapshot()['rate_per_second'] == pytest.approx(1.05)
+
+
+def test_the_pause_lasts_retry_after_seconds(clock):
+    limiter = RateLimiter(rate=2, capacity=3, default_pause=60)
+    limiter.throttle(retry_after=7)
+    assert limiter.try_acquire() == pytest.approx(7)
+    clock.advance(7)
+    assert limiter.try_acquire() == pytest.approx(1)
+    assert limiter.snapshot()['throttle_events'] == 1
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.throttled = []
+
+    def acquire(self):
+        pass
+
+    def success(self):
+        pass
+
+    def throttle(self, retry_after=None):
+        self.throttled.append(retry_after)
+
+
+def rate_limit_error(headers):
+    return ApiError(types.SimpleNamespace(
+        result=types.SimpleNamespace(error_code=4003, message='Rate limit exceeded'),
+        request_response=types.SimpleNamespace(headers=headers)))
+
+
+def test_smartsheet_calls_honor_retry_after(server, monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(server, 'smartsheet_rate_limiter', limiter)
+    errors = [rate_limit_error({'Retry-After': '12'}), rate_limit_error({})]
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert server.smartsheet_api_call_with_backoff(call) == 'ok'
+    # The header's delay when Smartsheet sends one, the limiter's default pause otherwise
+    assert limiter.throttled == [12.0, None]
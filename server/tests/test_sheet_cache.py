@@ -0,0 +1,48 @@
+import smartsheet
+
+from fake_smartsheet import FakeSmartsheet
+from sheet_cache import CachedRow, SheetReplica
+
+
+def sdk_row(row_id, values):
+    return smartsheet.models.Row({'id': row_id, 'cells': [
+        {'columnId': column_id, 'value': value} for column_id, value in values.items()]})
+
+
+class RecordingListener:
+    def __init__(self):
+        self.changes = []
+
+    def row_changed(self, row_id, row):
+        self.changes.append((row_id, row))
+
+    def rows_replaced(self, rows):
+        self.changes.append(('replaced', rows))
+
+
+def test_stored_rows_index_their_cells_by_column_id():
+    replica = SheetReplica(None, 1, api_call=None)
+    listener = RecordingListener()
+    replica.add_listener(listener)
+    replica.store_rows([sdk_row(10, {100: 'EQ-10', 101: 'Open'})])
+    row = replica.get_row(10)
+    assert isinstance(row, CachedRow)
+    assert row.cells.keys() == {100, 101}
+    assert row.get_column(101).value == 'Open'
+    assert row.get_column(999) is None
+    # Listeners get the indexed row too
+    assert listener.changes == [(10, row)]
+
+
+def test_full_load_stores_indexed_rows():
+    client = FakeSmartsheet()
+    client.Sheets.add_row(10, {'Equipment Ticket': 'EQ-10'})
+    client.Sheets.add_row(11, {'Equipment Ticket': 'EQ-11'})
+    replica = SheetReplica(client, 1, api_call=lambda method, *args, **kwargs: method(*args, **kwargs))
+    assert replica.load_all()
+    ticket_column = replica.schema.column_id('Equipment Ticket')
+    assert all(isinstance(row, CachedRow) for row in replica.rows.values())
+    assert {row_id: row.get_column(ticket_column).value for row_id, row in replica.rows.items()} == {
+        10: 'EQ-10',
+        11: 'EQ-11',
+    }
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight, call_key
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def run_concurrently(flight, key, fn, callers):
+    # Each caller's result, or the exception it got
+    outcomes = [None] * callers
+
+    def caller(index):
+        try:
+            outcomes[index] = flight.do(key, fn)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_identical_calls_make_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'sheet'
+
+    threads, outcomes = run_concurrently(flight, 'get_sheet', fetch, 5)
+    # Everyone joins the leader's call before it returns
+    assert wait_until(lambda: flight.snapshot()['collapsed'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert outcomes == ['sheet'] * 5
+    assert flight.snapshot() == {'calls': 1, 'collapsed': 4, 'in_flight': 0}
+
+
+def test_the_error_reaches_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ValueError('sheet not found')
+
+    threads, outcomes = run_concurrently(flight, 'get_sheet', fetch, 3)
+    assert wait_until(lambda: flight.snapshot()['collapsed'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert [type(outcome) for outcome in outcomes] == [ValueError] * 3
+
+
+def test_the_key_is_released_once_the_call_is_done():
+    flight = SingleFlight()
+    results = iter(['first', 'second'])
+    assert flight.do('get_sheet', lambda: next(results)) == 'first'
+    # A later call is not served the old result, it fetches again
+    assert flight.do('get_sheet', lambda: next(results)) == 'second'
+    with pytest.raises(KeyError):
+        flight.do('get_sheet', lambda: {}['missing'])
+    assert flight.do('get_sheet', lambda: 'after an error') == 'after an error'
+    assert flight.snapshot() == {'calls': 4, 'collapsed': 0, 'in_flight': 0}
+
+
+def test_call_keys_match_for_equal_arguments():
+    class Sheets:
+        def get_sheet(self, sheet_id, row_ids=None):
+            pass
+
+    sheets = Sheets()
+    assert (call_key(sheets.get_sheet, (1,), {'row_ids': [10, 11]}) ==
+            call_key(sheets.get_sheet, (1,), {'row_ids': [10, 11]}))
+    assert (call_key(sheets.get_sheet, (1,), {'row_ids': [10, 11]}) !=
+            call_key(sheets.get_sheet, (1,), {'row_ids': [10]}))
@@ -0,0 +1,64 @@
+import json
+
+from sse_broadcaster import SseBroadcaster, StreamFilter
+
+
+def test_lag_of_a_client_behind_an_expired_log():
+    broadcaster = SseBroadcaster(max_age=60, first_id=1)
+    client = broadcaster.connect()
+    broadcaster.publish(b"data: 1\n\n")
+    broadcaster.publish(b"data: 2\n\n")
+    # Both frames age out before the client reads them
+    broadcaster.expire(broadcaster.log[-1].published_at + 61)
+    assert not broadcaster.log
+    assert broadcaster.lag_locked(client.cursor) == (2, 0)
+    snapshot, = broadcaster.client_snapshots()
+    assert (snapshot['lag_events'], snapshot['lag_bytes']) == (2, 0)
+
+
+def test_lag_counts_frames_and_bytes_after_the_cursor():
+    broadcaster = SseBroadcaster(first_id=1)
+    client = broadcaster.connect()
+    broadcaster.publish(b"data: 1\n\n")
+    broadcaster.publish(b"data: 2\n\n")
+    assert broadcaster.lag_locked(client.cursor) == (2, broadcaster.total_bytes)
+    broadcaster.read(client)
+    assert broadcaster.lag_locked(client.cursor) == (0, 0)
+
+
+def ticket_frame(data):
+    return f"data: {json.dumps([data])}\n\n".encode('utf-8')
+
+
+def publish_ticket(broadcaster, data):
+    broadcaster.publish(ticket_frame(data), key=data['Equipment Ticket'], data=data,
+                        tags=StreamFilter.tags(action=data['Action']))
+
+
+def test_collapse_merges_the_changes_of_a_ticket():
+    broadcaster = SseBroadcaster(first_id=1, encode=ticket_frame)
+    client = broadcaster.connect(policy='collapse', max_lag_events=2)
+    publish_ticket(broadcaster, {'Equipment Ticket': 'T1', 'Action': 'updated', 'Status': 'Shipped'})
+    publish_ticket(broadcaster, {'Equipment Ticket': 'T2', 'Action': 'updated', 'Status': 'Open'})
+    publish_ticket(broadcaster, {'Equipment Ticket': 'T1', 'Action': 'updated', 'Tracking': '1Z99'})
+    frames = broadcaster.read(client)
+    assert client.stats['collapsed'] == 1
+    assert frames == [
+        b"id: 2\n" + ticket_frame({'Equipment Ticket': 'T2', 'Action': 'updated', 'Status': 'Open'}),
+        b"id: 3\n" + ticket_frame({'Equipment Ticket': 'T1', 'Action': 'updated', 'Status': 'Shipped',
+                                   'Tracking': '1Z99'}),
+    ]
+
+
+def test_collapse_keeps_the_subscribed_columns_of_the_merged_changes():
+    broadcaster = SseBroadcaster(first_id=1, encode=ticket_frame)
+    client = broadcaster.connect(policy='collapse', max_lag_events=1,
+                                 stream_filter=StreamFilter(columns=['Status', 'Tracking']))
+    publish_ticket(broadcaster, {'Equipment Ticket': 'T1', 'Action': 'updated', 'Status': 'Shipped'})
+    publish_ticket(broadcaster, {'Equipment Ticket': 'T1', 'Action': 'updated', 'Notes': 'call back'})
+    publish_ticket(broadcaster, {'Equipment Ticket': 'T1', 'Action': 'updated', 'Tracking': '1Z99'})
+    frames = broadcaster.read(client)
+    assert frames == [
+        b"id: 3\n" + ticket_frame({'Equipment Ticket': 'T1', 'Action': 'updated', 'Status': 'Shipped',
+                                   'Tracking': '1Z99'}),
+    ]
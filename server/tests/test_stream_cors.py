@@ -0,0 +1,37 @@
+import asyncio
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+ORIGIN = 'http://dashboard.example'
+
+
+def test_waitress_stream_allows_any_origin(server):
+    client = server.app.test_client()
+    response = client.get('/stream', headers={'Origin': ORIGIN}, buffered=False)
+    try:
+        assert response.headers.getlist('Access-Control-Allow-Origin') == ['*']
+        assert response.mimetype == 'text/event-stream'
+    finally:
+        response.close()
+
+
+def test_aiohttp_stream_allows_any_origin(server):
+    async def fetch_headers():
+        test_server = TestServer(server.aiohttp_app())
+        await test_server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(test_server.make_url('/stream'), headers={'Origin': ORIGIN}) as response:
+                    return response.headers
+        finally:
+            await test_server.close()
+
+    headers = asyncio.run(fetch_headers())
+    assert headers.getall('Access-Control-Allow-Origin') == ['*']
+    assert headers['Content-Type'] == 'text/event-stream'
+
+
+def test_other_routes_keep_flask_cors(server):
+    response = server.app.test_client().get('/api/stats', headers={'Origin': ORIGIN})
+    assert response.headers.getlist('Access-Control-Allow-Origin') == [ORIGIN]
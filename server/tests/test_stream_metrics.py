@@ -0,0 +1,20 @@
+def first_chunk(server, **connect_args):
+    stream = server.stream_tickets(**connect_args)
+    try:
+        return next(stream)
+    finally:
+        stream.close()
+
+
+def test_replayed_current_metrics_are_not_sent_twice(server):
+    server.event_bus.publish({'type': 'metrics', 'data': {'Current Open Tickets': '12'}})
+    chunk = first_chunk(server, replay=10)
+    assert chunk.count(server.latest_metrics_frame) == 1
+
+
+def test_current_metrics_follow_a_replay_without_them(server):
+    server.event_bus.publish({'type': 'metrics', 'data': {'Current Open Tickets': '13'}})
+    server.add_ticket_to_queue({'Equipment Ticket': 'EQ-1', 'Action': 'updated', 'Status': 'Open'})
+    # Only the ticket is replayed, the metrics come after it without an id
+    chunk = first_chunk(server, replay=1)
+    assert chunk.count(b'event: metrics') == 1 and chunk.endswith(server.latest_metrics_frame)
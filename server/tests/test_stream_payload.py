@@ -0,0 +1,104 @@
+import json
+import zlib
+
+import pytest
+
+from sse_broadcaster import CompactEncoder, SseBroadcaster, StreamCompressor
+
+UPDATES = [
+    {'Equipment Ticket': 'EQ-1', 'Action': 'added', 'Status': 'Open', 'Serial Number(s)': ['A1']},
+    {'Equipment Ticket': 'EQ-2', 'Action': 'added', 'Status': 'Open', 'Customer Name': 'Acme'},
+    {'Equipment Ticket': 'EQ-1', 'Action': 'updated', 'Status': 'Shipped', 'Serial Number(s)': ['A1']},
+    {'Equipment Ticket': 'EQ-1', 'Action': 'updated', 'Status': 'Shipped', 'Config Lab Rep': 'jdoe'},
+]
+
+
+def ticket_frame(data):
+    return f"data: {json.dumps([data])}\n\n".encode('utf-8')
+
+
+def sse_messages(chunk):
+    # {field: value} of every SSE message in a chunk
+    messages = []
+    for block in chunk.decode('utf-8').split('\n\n'):
+        if block:
+            messages.append(dict(line.split(': ', 1) for line in block.split('\n')))
+    return messages
+
+
+class CompactDecoder:
+    # What the dashboard does with "delta" events: rebuild each ticket event from the key dictionary and states
+    def __init__(self):
+        self.keys = []
+        self.states = {}
+
+    def decode(self, message):
+        if message.get('r'):
+            self.keys = []
+            self.states = {}
+        self.keys.extend(message.get('k', []))
+        state = self.states.setdefault(message['t'], {})
+        event = {'Equipment Ticket': message['t']}
+        for field in message['f']:
+            if isinstance(field, list):
+                index, value = field
+                state[self.keys[index]] = value
+            else:
+                index = field
+            event[self.keys[index]] = state[self.keys[index]]
+        return event
+
+
+def stream_batches(encoding):
+    # Each update published and read as its own batch, as a stream flushes them, with the metrics in between
+    broadcaster = SseBroadcaster(first_id=1, encode=ticket_frame)
+    client = broadcaster.connect(encoder=CompactEncoder())
+    compressor = StreamCompressor(encoding)
+    batches = []
+    for index, data in enumerate(UPDATES):
+        broadcaster.publish(ticket_frame(data), key=data['Equipment Ticket'], data=data)
+        if index == 1:
+            broadcaster.publish(b"event: metrics\ndata: {\"Current Open Tickets\": \"2\"}\n\n", key='metrics')
+        batch = b''.join(broadcaster.read(client))
+        batches.append((batch, compressor.compress(batch)))
+    return batches
+
+
+@pytest.mark.parametrize('encoding, wbits', [('gzip', 16 + zlib.MAX_WBITS), ('deflate', zlib.MAX_WBITS)])
+def test_a_compressed_compact_stream_decodes_batch_by_batch(encoding, wbits):
+    decompressor = zlib.decompressobj(wbits)
+    decoder = CompactDecoder()
+    events = []
+    metrics = []
+    for batch, compressed in stream_batches(encoding):
+        # Flushed per batch: everything sent so far decodes without waiting for more
+        assert decompressor.decompress(compressed) == batch
+        for message in sse_messages(batch):
+            if message.get('event') == 'delta':
+                events.append(decoder.decode(json.loads(message['data'])))
+            else:
+                metrics.append(json.loads(message['data']))
+    assert events == UPDATES
+    assert metrics == [{'Current Open Tickets': '2'}]
+
+
+def test_deltas_only_carry_changed_values():
+    batches = stream_batches('gzip')
+    messages = [json.loads(sse_messages(batch)[-1]['data']) for batch, _ in batches]
+    assert messages[0] == {'r': 1, 't': 'EQ-1', 'k': ['Action', 'Status', 'Serial Number(s)'],
+                           'f': [[0, 'added'], [1, 'Open'], [2, ['A1']]]}
+    # EQ-1 again: only the action and the status changed, the serial numbers are referred to by index
+    assert messages[2] == {'t': 'EQ-1', 'f': [[0, 'updated'], [1, 'Shipped'], 2]}
+    assert messages[3] == {'t': 'EQ-1', 'k': ['Config Lab Rep'], 'f': [0, 1, [4, 'jdoe']]}
+
+
+def test_a_forgotten_ticket_is_sent_in_full():
+    broadcaster = SseBroadcaster(first_id=1)
+    client = broadcaster.connect(encoder=CompactEncoder(max_tickets=1))
+    decoder = CompactDecoder()
+    for data in (UPDATES[0], UPDATES[1], UPDATES[2]):
+        broadcaster.publish(ticket_frame(data), key=data['Equipment Ticket'], data=data)
+    messages = [json.loads(message['data']) for frame in broadcaster.read(client) for message in sse_messages(frame)]
+    # EQ-1's state was dropped to make room for EQ-2, so nothing in its update refers to it
+    assert all(isinstance(field, list) for field in messages[2]['f'])
+    assert [decoder.decode(message) for message in messages] == [UPDATES[0], UPDATES[1], UPDATES[2]]
@@ -0,0 +1,54 @@
+import time
+
+from webhook_pipeline import DeliveryDeduplicator, WebhookWorkerPool
+
+
+def cell_event(row_id, column_id, timestamp):
+    return {'objectType': 'cell', 'eventType': 'updated', 'rowId': row_id, 'columnId': column_id,
+            'timestamp': timestamp}
+
+
+def post_events(client, server, *events):
+    payload = {'webhookId': 1, 'scopeObjectId': server.SMARTSHEET_SHEET_ID, 'events': list(events)}
+    return client.post('/webhook', json=payload)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_redelivery_of_an_event_merged_away_by_coalescing_is_dropped(server, monkeypatch):
+    handled = []
+    pool = WebhookWorkerPool(lambda payload: handled.append([event['timestamp'] for event in payload['events']]),
+                             workers=1, coalesce_window=0.1, coalesce_max=5)
+    pool.start()
+    monkeypatch.setattr(server, 'webhook_pool', pool)
+    monkeypatch.setattr(server, 'webhook_deduplicator', DeliveryDeduplicator())
+    client = server.app.test_client()
+
+    post_events(client, server, cell_event(7, 100, 't1'))
+    post_events(client, server, cell_event(7, 100, 't2'))
+    assert wait_for(lambda: handled)
+    response = post_events(client, server, cell_event(7, 100, 't1'))
+
+    assert response.status_code == 200
+    time.sleep(0.3)
+    assert handled == [['t2']]
+    assert server.webhook_deduplicator.snapshot()['hits'] == 1
+
+
+def test_events_of_a_rejected_payload_are_accepted_when_redelivered(server, monkeypatch):
+    class FullPool:
+        def submit(self, data, done=None):
+            return False
+
+    monkeypatch.setattr(server, 'webhook_pool', FullPool())
+    monkeypatch.setattr(server, 'webhook_deduplicator', DeliveryDeduplicator())
+    client = server.app.test_client()
+
+    assert post_events(client, server, cell_event(8, 100, 't1')).status_code == 503
+    assert post_events(client, server, cell_event(8, 100, 't1')).status_code == 503
+    assert server.webhook_deduplicator.snapshot()['hits'] == 0
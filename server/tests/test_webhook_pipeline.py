@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+import time
+
+from webhook_pipeline import WebhookInbox, WebhookWorkerPool, group_events
+
+
+def test_group_events_is_the_only_row_and_cell_filter():
+    events = [
+        {'objectType': 'sheet', 'eventType': 'updated', 'id': 1},
+        {'objectType': 'row', 'eventType': 'updated', 'id': 10},
+        {'objectType': 'cell', 'eventType': 'updated', 'rowId': 10, 'columnId': 100},
+        {'objectType': 'column', 'eventType': 'created', 'id': 200},
+        {'objectType': 'cell', 'eventType': 'updated', 'rowId': 11, 'columnId': 100},
+        {'objectType': 'row', 'eventType': 'created', 'id': 11},
+        {'objectType': 'cell', 'eventType': 'updated', 'rowId': 10, 'columnId': 101},
+    ]
+    row_events, cells_by_row = group_events(events)
+    assert [event['id'] for event in row_events] == [10, 11]
+    assert {row_id: [cell['columnId'] for cell in cells] for row_id, cells in cells_by_row.items()} == {
+        10: [100, 101],
+        11: [100],
+    }
+
+
+def cell_payload(row_id, column_id, value):
+    return {'scopeObjectId': 1, 'events': [
+        {'objectType': 'cell', 'eventType': 'updated', 'rowId': row_id, 'columnId': column_id, 'value': value}]}
+
+
+def handled_rows(payload):
+    return sorted({event['rowId'] for event in payload['events']})
+
+
+def test_rows_are_debounced_independently():
+    handled = []
+    pool = WebhookWorkerPool(lambda payload: handled.append((time.monotonic(), payload)), workers=1,
+                             coalesce_window=0.2, coalesce_max=5)
+    pool.start()
+    started = time.monotonic()
+    pool.submit(cell_payload(2, 100, 'lone'))
+    # Row 1 keeps changing for longer than the window, it must not hold row 2 back
+    for value in range(8):
+        pool.submit(cell_payload(1, 100, value))
+        time.sleep(0.05)
+    deadline = time.monotonic() + 5
+    while len(handled) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    (lone_at, lone), (burst_at, burst) = handled
+    assert handled_rows(lone) == [2] and lone_at - started < 0.35
+    assert handled_rows(burst) == [1] and [event['value'] for event in burst['events']] == [7]
+    assert pool.snapshot()['coalesced'] == 7
+
+
+def test_held_payloads_count_towards_the_queue_size():
+    release = threading.Event()
+    done = []
+    pool = WebhookWorkerPool(lambda payload: release.wait(5), workers=1, queue_size=3,
+                             coalesce_window=0.05, coalesce_max=5)
+    pool.start()
+    accepted = [pool.submit(cell_payload(row_id, 100, 'x'), done=lambda: done.append(1)) for row_id in range(5)]
+    assert accepted == [True, True, True, False, False]
+    release.set()
+    deadline = time.monotonic() + 5
+    while len(done) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(done) == 3 and pool.snapshot()['pending'] == [0]
+    assert pool.submit(cell_payload(9, 100, 'x'))
+
+
+def test_inbox_entry_committed_after_its_timeout_is_still_deleted(tmp_path):
+    inbox = WebhookInbox(str(tmp_path / 'inbox.db'), commit_timeout=0.01)
+    # The commit loop is not running yet, so the append times out
+    entry_id = inbox.append({'scopeObjectId': 1, 'events': []})
+    assert entry_id is not None
+    inbox.mark_done(entry_id)
+    inbox.start()
+    deadline = time.monotonic() + 5
+    while inbox.snapshot()['completed'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert inbox.pending() == []
+
+
+def test_inbox_replays_what_was_not_done(tmp_path):
+    path = str(tmp_path / 'inbox.db')
+    inbox = WebhookInbox(path)
+    inbox.start()
+    first = inbox.append({'events': [1]})
+    second = inbox.append({'events': [2]})
+    inbox.mark_done(first)
+    deadline = time.monotonic() + 5
+    while inbox.snapshot()['completed'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # A new inbox on the same file (a restart) continues the ids after the pending entry
+    restarted = WebhookInbox(path)
+    assert restarted.pending() == [(second, {'events': [2]})]
+    restarted.start()
+    assert restarted.append({'events': [3]}) == second + 1
+
+
+class DeletesFailOnce:
+    # Connection whose first DELETE fails, rolling back the whole group commit
+    def __init__(self, conn):
+        self.conn = conn
+        self.failures = 1
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        if sql.startswith('DELETE') and rows and self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError('disk I/O error')
+        return self.conn.executemany(sql, rows)
+
+
+def test_deletes_of_a_failed_commit_are_retried(tmp_path):
+    path = str(tmp_path / 'inbox.db')
+    inbox = WebhookInbox(path, retry_delay=0.01)
+    connect = inbox.connect
+    inbox.connect = lambda: DeletesFailOnce(connect())
+    inbox.start()
+    entry_id = inbox.append({'events': [1]})
+    assert entry_id is not None
+    inbox.mark_done(entry_id)
+    deadline = time.monotonic() + 5
+    while inbox.snapshot()['completed'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert inbox.snapshot()['commit_errors'] == 1
+    assert WebhookInbox(path).pending() == []
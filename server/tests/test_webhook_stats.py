@@ -0,0 +1,36 @@
+import threading
+
+from rate_limiter import CallCounter, RateLimiter
+
+
+def test_each_caller_counts_only_its_own_calls():
+    limiter = RateLimiter(rate=1000, capacity=100)
+    counts = {}
+
+    def caller(name, calls):
+        counter = CallCounter()
+        for _ in range(calls):
+            limiter.acquire()
+        counts[name] = counter.stop()
+
+    threads = [threading.Thread(target=caller, args=(name, calls)) for name, calls in (('a', 3), ('b', 1))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counts == {'a': 3, 'b': 1}
+
+
+def test_api_calls_of_a_payload_include_the_row_fallbacks(server, monkeypatch):
+    row_id = 5151
+    server.smart.Sheets.add_row(row_id, {'Equipment Ticket': 'EQ-5151', 'Status': 'Open'})
+    # The replica is not patched from the events, so the row is fetched when it is first read
+    monkeypatch.setattr(server.sheet_replica, 'apply_events', lambda events: 0)
+    status_column = server.sheet_replica.schema.column_id('Status')
+    server.process_webhook({'webhookId': 1, 'scopeObjectId': server.SMARTSHEET_SHEET_ID, 'events': [
+        {'objectType': 'row', 'eventType': 'updated', 'id': row_id, 'timestamp': '2026-10-18T12:00:00Z'},
+        {'objectType': 'cell', 'eventType': 'updated', 'rowId': row_id, 'columnId': status_column,
+         'timestamp': '2026-10-18T12:00:00Z'},
+    ]})
+    assert server.sheet_replica.rows.get(row_id) is not None
+    assert server.webhook_stats['last_webhook_api_calls'] == 1
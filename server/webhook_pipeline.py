@@ -0,0 +1,409 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue, Empty
+
+
+def event_row_id(event):
+    # Row an event belongs to (None for sheet/column level events)
+    if event['objectType'] == 'row':
+        return event['id']
+    return event.get('rowId')
+
+
+def split_by_row(data):
+    # One payload per row (sheet/column level events under None), keeping the original event order
+    parts = {}
+    for event in data.get('events', []):
+        parts.setdefault(event_row_id(event), []).append(event)
+    return {row_id: dict(data, events=events) for row_id, events in parts.items()}
+
+
+def group_events(events):
+    # Single pass over a payload: row events in delivery order and cell events indexed by row id
+    row_events = []
+    cells_by_row = {}
+    for event in events:
+        if event['objectType'] == 'row':
+            row_events.append(event)
+        elif event['objectType'] == 'cell':
+            cells_by_row.setdefault(event['rowId'], []).append(event)
+    return row_events, cells_by_row
+
+
+def merge_payloads(payloads):
+    # Merge payloads into one with a single row event per row and a single cell event per cell
+    merged = {}
+    for data in payloads:
+        for event in data.get('events', []):
+            if event['objectType'] == 'row':
+                key = ('row', event['id'])
+                previous = merged.get(key)
+                # A row created and then edited within the window is still reported as added
+                if previous and previous['eventType'] == 'created' and event['eventType'] == 'updated':
+                    event = dict(event, eventType='created')
+            elif event['objectType'] == 'cell':
+                key = ('cell', event['rowId'], event['columnId'])
+            else:
+                key = ('other', len(merged))
+            merged[key] = event
+    return dict(payloads[-1], events=list(merged.values()))
+
+
+def event_key(data, event):
+    # Idempotency key of an event: webhook, sheet, object (row/column id or cell), event type and timestamp
+    if event['objectType'] == 'cell':
+        object_id = (event.get('rowId'), event.get('columnId'))
+    else:
+        object_id = event.get('id')
+    return (data.get('webhookId'), data.get('scopeObjectId'), event['objectType'], object_id,
+            event.get('eventType'), event.get('timestamp'))
+
+
+class DeliveryDeduplicator:
+    """
+    Bounded, time-expiring set of event keys already handled (LRU with TTL).
+
+    Smartsheet redelivers callbacks it considers timed out; events seen within
+    the TTL are dropped before any API call is made.
+    """
+
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evicted': 0,
+        }
+
+    def expire(self, now):
+        # Entries are kept in insertion order, so expired ones are at the front
+        while self.seen:
+            key, seen_at = next(iter(self.seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            self.seen.popitem(last=False)
+            self.stats['expired'] += 1
+
+    def filter(self, data):
+        # Returns the payload without the events that were already handled
+        now = time.monotonic()
+        events = []
+        with self.lock:
+            self.expire(now)
+            for event in data.get('events', []):
+                key = event_key(data, event)
+                if key in self.seen:
+                    self.stats['hits'] += 1
+                    continue
+                self.stats['misses'] += 1
+                self.seen[key] = now
+                events.append(event)
+            while len(self.seen) > self.max_size:
+                self.seen.popitem(last=False)
+                self.stats['evicted'] += 1
+        return dict(data, events=events)
+
+    def forget(self, data):
+        # The payload's events were not accepted after all, let their redelivery through
+        with self.lock:
+            for event in data.get('events', []):
+                self.seen.pop(event_key(data, event), None)
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self.seen)
+        return stats
+
+
+class PayloadTracker:
+    # Calls done() once every shard of a split payload has been handled
+    def __init__(self, parts, done=None):
+        self.remaining = parts
+        self.done = done
+        self.lock = threading.Lock()
+
+    def part_done(self):
+        with self.lock:
+            self.remaining -= 1
+            finished = self.remaining == 0
+        if finished and self.done:
+            self.done()
+
+
+class HeldRow:
+    # Payloads of one row held back by a worker until the row has been quiet for the coalesce window
+    def __init__(self, now):
+        self.payloads = []
+        self.trackers = []
+        self.first = now
+        self.last = now
+
+
+class WebhookWorkerPool:
+    """
+    Fixed number of worker threads, each fed by its own bounded queue.
+
+    Events are sharded by row id so every update of a row is handled by the same
+    worker, in the order Smartsheet delivered it. With a coalesce window, a worker
+    holds each row's payloads until that row has been quiet for the window (at
+    most coalesce_max after its first one), so a burst of edits to one row is
+    fetched, printed and streamed once without delaying the other rows. Held
+    payloads still count towards queue_size, which keeps the back-pressure.
+    """
+
+    def __init__(self, handler, workers=4, queue_size=100, coalesce_window=0, coalesce_max=10):
+        self.handler = handler
+        self.coalesce_window = coalesce_window
+        self.coalesce_max = coalesce_max
+        self.queue_size = queue_size
+        self.queues = [Queue(maxsize=queue_size) for _ in range(workers)]
+        # Payloads queued or held per worker, until handled
+        self.pending = [0] * workers
+        self.submit_lock = threading.Lock()
+        self.threads = []
+        self.stats = {
+            'accepted': 0,
+            'rejected': 0,
+            'processed': 0,
+            'failed': 0,
+            'coalesced': 0,
+        }
+        self.stats_lock = threading.Lock()
+
+    def shard(self, row_id):
+        if row_id is None:
+            return 0
+        return row_id % len(self.queues)
+
+    def split(self, data):
+        # Split a payload into one payload per worker, keeping the original event order
+        shards = {}
+        for event in data.get('events', []):
+            shards.setdefault(self.shard(event_row_id(event)), []).append(event)
+        return {index: dict(data, events=events) for index, events in shards.items()}
+
+    def submit(self, data, done=None):
+        # Queue a payload, returns False (nothing queued) when any target worker is saturated.
+        # done() is called once all of the payload's events have been handled.
+        shards = self.split(data)
+        tracker = PayloadTracker(len(shards), done)
+        with self.submit_lock:
+            if any(self.pending[index] >= self.queue_size for index in shards):
+                with self.stats_lock:
+                    self.stats['rejected'] += 1
+                return False
+            for index, payload in shards.items():
+                self.pending[index] += 1
+                self.queues[index].put_nowait((payload, tracker))
+        with self.stats_lock:
+            self.stats['accepted'] += 1
+        if not shards and done:
+            done()
+        return True
+
+    def release(self, index, tracker):
+        # A queued payload was fully handled: free its slot, then report it
+        with self.submit_lock:
+            self.pending[index] -= 1
+        tracker.part_done()
+
+    def due(self, held_row):
+        return min(held_row.last + self.coalesce_window, held_row.first + self.coalesce_max)
+
+    def hold(self, held, index, payload, tracker, now):
+        # File each row's part of a payload under that row, the payload is released once every part was handled
+        parts = split_by_row(payload)
+        row_tracker = PayloadTracker(len(parts), lambda: self.release(index, tracker))
+        for row_id, part in parts.items():
+            held_row = held.get(row_id)
+            if held_row is None:
+                held_row = held[row_id] = HeldRow(now)
+            held_row.payloads.append(part)
+            held_row.trackers.append(row_tracker)
+            held_row.last = now
+
+    def handle(self, payloads, trackers):
+        try:
+            self.handler(payloads[0] if len(payloads) == 1 else merge_payloads(payloads))
+            with self.stats_lock:
+                self.stats['processed'] += 1
+                self.stats['coalesced'] += len(payloads) - 1
+        except Exception as e:
+            print(f"Webhook worker failed: {e}")
+            with self.stats_lock:
+                self.stats['failed'] += 1
+        finally:
+            # Completion (and the inbox mark) only after the merged payload was handled
+            for tracker in trackers:
+                tracker.part_done()
+
+    def work(self, index):
+        work_queue = self.queues[index]
+        # Row id -> HeldRow, for the rows waiting out their coalesce window
+        held = {}
+        while True:
+            timeout = None
+            if held:
+                timeout = max(0, min(self.due(held_row) for held_row in held.values()) - time.monotonic())
+            try:
+                payload, tracker = work_queue.get(timeout=timeout)
+            except Empty:
+                payload = None
+            now = time.monotonic()
+            if payload is not None:
+                work_queue.task_done()
+                if self.coalesce_window <= 0:
+                    self.handle([payload], [PayloadTracker(1, lambda: self.release(index, tracker))])
+                    continue
+                self.hold(held, index, payload, tracker, now)
+            # Every row whose window is over, handled together in one merged payload
+            ready = [row_id for row_id, held_row in held.items() if self.due(held_row) <= now]
+            if ready:
+                rows = [held.pop(row_id) for row_id in ready]
+                self.handle([part for held_row in rows for part in held_row.payloads],
+                            [row_tracker for held_row in rows for row_tracker in held_row.trackers])
+
+    def start(self):
+        if not self.threads:
+            for index in range(len(self.queues)):
+                thread = threading.Thread(target=self.work, args=(index,), daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def snapshot(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats['workers'] = len(self.queues)
+        stats['queued'] = [work_queue.qsize() for work_queue in self.queues]
+        with self.submit_lock:
+            stats['pending'] = list(self.pending)
+        return stats
+
+
+class InboxEntry:
+    def __init__(self, entry_id, payload):
+        self.id = entry_id
+        self.payload = payload
+        self.committed = threading.Event()
+        self.failed = False
+
+
+class WebhookInbox:
+    """
+    Durable write-ahead log of received webhook payloads (SQLite in WAL mode).
+
+    Payloads are appended before Smartsheet is acked and deleted once processed,
+    so anything still in the inbox at startup was lost in flight and is replayed.
+    Appends are group committed: concurrent deliveries share one transaction.
+    Entry ids are assigned on append, so an entry whose commit was slow is
+    still deleted once done (its delete is queued behind its insert). Deletes
+    of a failed commit are retried with the next one.
+    """
+
+    def __init__(self, path, commit_timeout=5, retry_delay=1):
+        self.path = path
+        self.commit_timeout = commit_timeout
+        self.retry_delay = retry_delay
+        self.appends = []
+        self.done = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stats = {
+            'appended': 0,
+            'completed': 0,
+            'commits': 0,
+            'commit_errors': 0,
+        }
+        conn = self.connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS inbox ('
+                         'id INTEGER PRIMARY KEY AUTOINCREMENT, received REAL NOT NULL, payload TEXT NOT NULL)')
+            self.next_id = (conn.execute('SELECT MAX(id) FROM inbox').fetchone()[0] or 0) + 1
+        conn.close()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.commit_loop, daemon=True)
+            self.thread.start()
+
+    def append(self, data):
+        # Durably store a payload, returns its entry id (None if the commit failed)
+        payload = json.dumps(data)
+        with self.condition:
+            entry = InboxEntry(self.next_id, payload)
+            self.next_id += 1
+            self.appends.append(entry)
+            self.condition.notify()
+        if not entry.committed.wait(self.commit_timeout):
+            # Still queued: a later commit stores it, and mark_done(id) deletes it after that
+            print("Webhook inbox commit timed out, payload is not durable yet.")
+        return None if entry.failed else entry.id
+
+    def mark_done(self, entry_id):
+        if entry_id is None:
+            return
+        with self.condition:
+            self.done.append(entry_id)
+            self.condition.notify()
+
+    def commit_loop(self):
+        conn = self.connect()
+        while True:
+            with self.condition:
+                while not self.appends and not self.done:
+                    self.condition.wait()
+                appends, self.appends = self.appends, []
+                done, self.done = self.done, []
+            retry = False
+            try:
+                # One transaction (and one fsync) for everything that arrived meanwhile
+                with conn:
+                    conn.executemany('INSERT INTO inbox (id, received, payload) VALUES (?, ?, ?)',
+                                     [(entry.id, time.time(), entry.payload) for entry in appends])
+                    conn.executemany('DELETE FROM inbox WHERE id = ?', [(entry_id,) for entry_id in done])
+                self.stats['commits'] += 1
+                self.stats['appended'] += len(appends)
+                self.stats['completed'] += len(done)
+            except Exception as e:
+                print(f"Webhook inbox commit failed: {e}")
+                self.stats['commit_errors'] += 1
+                for entry in appends:
+                    entry.failed = True
+                # The deletes were rolled back too: retried with the next commit, else they would be replayed
+                with self.condition:
+                    self.done[:0] = done
+                retry = bool(done)
+            for entry in appends:
+                entry.committed.set()
+            if retry:
+                # Failed deletes are waiting, give the database a moment before retrying them
+                time.sleep(self.retry_delay)
+
+    def pending(self):
+        # Payloads that were received but never marked done, oldest first
+        conn = self.connect()
+        try:
+            rows = conn.execute('SELECT id, payload FROM inbox ORDER BY id').fetchall()
+        finally:
+            conn.close()
+        return [(entry_id, json.loads(payload)) for entry_id, payload in rows]
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        with self.condition:
+            stats['waiting'] = len(self.appends)
+        return stats